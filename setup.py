@@ -61,11 +61,15 @@ setup(
         'pymodbus'<=2.5.3
     ],
     extras_require={
+        'benchmark': ['pytest-benchmark'],
+        'parquet': ['pyarrow'],
+        'hdf5': ['h5py'],
     },
     entry_points={
         'console_scripts': [
             'compressor = wsma_cryostat_compressor.cli:main',
-            'inverter = wsma_cryostat_compressor.inverter_cli:main'
+            'inverter = wsma_cryostat_compressor.inverter_cli:main',
+            'compressor-proxy = wsma_cryostat_compressor.proxy_cli:main'
 
         ]
     },
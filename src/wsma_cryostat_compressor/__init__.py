@@ -1,12 +1,84 @@
 __version__ = '0.1.1'
 
-from time import sleep
+import enum
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from math import inf, isfinite
+from time import monotonic, sleep, time
 from pymodbus.client.sync import ModbusTcpClient
-from pymodbus.payload import BinaryPayloadDecoder
-from pymodbus.constants import Endian
+from pymodbus.exceptions import ModbusIOException
+
+from wsma_cryostat_compressor.cache import IdentityCache
+from wsma_cryostat_compressor.connection import ManagedClient, default_pool
+from wsma_cryostat_compressor.decoder import BlockDecoder
+from wsma_cryostat_compressor.history import History
+from wsma_cryostat_compressor.registers import compressor_registers, register_accessors
+from wsma_cryostat_compressor.planner import default_max_gap
+from wsma_cryostat_compressor.retry import RetryPolicy
+from wsma_cryostat_compressor.stats import RequestStats, timed_request
 
 default_IP = "192.168.42.128"
 default_port = 502
+default_timeout = 3
+
+#: BlockDecoder: decoder for a single 32 bit float read from the compressor
+_float32_decoder = BlockDecoder([('value', 0, 'float32')])
+
+
+def _managed_client(address, port, timeout, pool):
+    """Get a managed Modbus client for a device.
+
+    Args:
+        address (str): address of the Modbus TCP server.
+        port (int): TCP port of the server.
+        timeout (float): timeout in seconds for each transaction.
+        pool (ConnectionPool): pool to get the client from, True for the default pool, or None for a new client.
+
+    Returns:
+        ManagedClient: the client."""
+    if pool is None:
+        return ManagedClient(ModbusTcpClient(address, port=port, timeout=timeout))
+    elif pool is True:
+        pool = default_pool
+    return pool.get(address, port, timeout=timeout)
+
+
+def _next_deadline(deadline, interval, now):
+    """Return the next deadline of a fixed cadence schedule.
+
+    Deadlines are multiples of `interval` after the first one, so that time spent reading does not
+    accumulate as drift. Deadlines that have already been missed are skipped.
+
+    Args:
+        deadline (float): the previous deadline.
+        interval (float): the interval between deadlines in seconds. If 0 or less, there is no wait.
+        now (float): the current time, on the same clock as `deadline`.
+
+    Returns:
+        float: the next deadline."""
+    if interval <= 0:
+        return now
+    deadline += interval
+    if deadline < now:
+        deadline += ((now - deadline) // interval + 1) * interval
+    return deadline
+
+
+def _poll_intervals(first, maximum):
+    """Generate intervals between polls that double from `first` up to `maximum`.
+
+    Args:
+        first (float): the first interval in seconds.
+        maximum (float): the largest interval in seconds.
+
+    Yields:
+        float: the next interval."""
+    interval = first
+    while True:
+        yield min(interval, maximum)
+        interval *= 2
+
 
 def _status_to_string(status_code):
     """Translate compressor status code to a human readable string.
@@ -37,6 +109,110 @@ def _status_to_string(status_code):
     return str_return
 
 
+class CompressorFlag(enum.IntFlag):
+    """Warning and error flags of the compressor.
+
+    The compressor reports its warnings and errors as the negative of the OR of these flags."""
+    COOLANT_IN_HIGH = 1 << 0
+    COOLANT_IN_LOW = 1 << 1
+    COOLANT_OUT_HIGH = 1 << 2
+    COOLANT_OUT_LOW = 1 << 3
+    OIL_HIGH = 1 << 4
+    OIL_LOW = 1 << 5
+    HELIUM_HIGH = 1 << 6
+    HELIUM_LOW = 1 << 7
+    LOW_PRESSURE_HIGH = 1 << 8
+    LOW_PRESSURE_LOW = 1 << 9
+    HIGH_PRESSURE_HIGH = 1 << 10
+    HIGH_PRESSURE_LOW = 1 << 11
+    DELTA_PRESSURE_HIGH = 1 << 12
+    DELTA_PRESSURE_LOW = 1 << 13
+    MOTOR_CURRENT_LOW = 1 << 14
+    THREE_PHASE_ERROR = 1 << 15
+    POWER_SUPPLY_ERROR = 1 << 16
+    STATIC_PRESSURE_HIGH = 1 << 17
+    STATIC_PRESSURE_LOW = 1 << 18
+    MOTOR_STALL = 1 << 19
+    COOLANT_IN_SENSOR = 1 << 20
+    COOLANT_OUT_SENSOR = 1 << 21
+    HELIUM_SENSOR = 1 << 22
+    OIL_SENSOR = 1 << 23
+    HIGH_PRESSURE_SENSOR = 1 << 24
+    LOW_PRESSURE_SENSOR = 1 << 25
+    MOTOR_CURRENT_SENSOR = 1 << 26
+    MOTOR_CURRENT_HIGH = 1 << 27
+    INVERTER_ERROR = 1 << 28
+    DRIVER_COMM_LOSS = 1 << 29
+    INVERTER_COMM_LOSS = 1 << 30
+
+
+#: dict: human readable message for each CompressorFlag
+_flag_messages = {
+    CompressorFlag.COOLANT_IN_HIGH: "Coolant In High",
+    CompressorFlag.COOLANT_IN_LOW: "Coolant In Low",
+    CompressorFlag.COOLANT_OUT_HIGH: "Coolant Out High",
+    CompressorFlag.COOLANT_OUT_LOW: "Coolant Out Low",
+    CompressorFlag.OIL_HIGH: "Oil High",
+    CompressorFlag.OIL_LOW: "Oil Low",
+    CompressorFlag.HELIUM_HIGH: "Helium High",
+    CompressorFlag.HELIUM_LOW: "Helium Low",
+    CompressorFlag.LOW_PRESSURE_HIGH: "Low Pressure High",
+    CompressorFlag.LOW_PRESSURE_LOW: "Low Pressure Low",
+    CompressorFlag.HIGH_PRESSURE_HIGH: "High Pressure High",
+    CompressorFlag.HIGH_PRESSURE_LOW: "High Pressure Low",
+    CompressorFlag.DELTA_PRESSURE_HIGH: "Delta Pressure High",
+    CompressorFlag.DELTA_PRESSURE_LOW: "Delta Pressure Low",
+    CompressorFlag.MOTOR_CURRENT_LOW: "Motor Current Low",
+    CompressorFlag.THREE_PHASE_ERROR: "Three Phase Error",
+    CompressorFlag.POWER_SUPPLY_ERROR: "Power Supply Error",
+    CompressorFlag.STATIC_PRESSURE_HIGH: "Static Pressure High",
+    CompressorFlag.STATIC_PRESSURE_LOW: "Static Pressure Low",
+    CompressorFlag.MOTOR_STALL: "Motor Stall",
+    CompressorFlag.COOLANT_IN_SENSOR: "Coolant In Sensor",
+    CompressorFlag.COOLANT_OUT_SENSOR: "Coolant Out Sensor",
+    CompressorFlag.HELIUM_SENSOR: "Helium Sensor",
+    CompressorFlag.OIL_SENSOR: "Oil Sensor",
+    CompressorFlag.HIGH_PRESSURE_SENSOR: "High Pressure Sensor",
+    CompressorFlag.LOW_PRESSURE_SENSOR: "Low Pressure Sensor",
+    CompressorFlag.MOTOR_CURRENT_SENSOR: "Motor Current Sensor",
+    CompressorFlag.MOTOR_CURRENT_HIGH: "Motor Current High",
+    CompressorFlag.INVERTER_ERROR: "Inverter Error",
+    CompressorFlag.DRIVER_COMM_LOSS: "Driver Comm Loss",
+    CompressorFlag.INVERTER_COMM_LOSS: "Inverter Comm Loss",
+}
+
+#: int: mask of all of the bits with a CompressorFlag
+_flag_mask = (1 << 31) - 1
+
+
+def _flag_bits(error_code):
+    """Return the bitset of the flags set in a compressor error or warning status code.
+
+    Args:
+        error_code: float: the error/warning code returned by the compressor.
+    Returns:
+        int: the bits of the flags set. 0 if the code is not finite."""
+    return int(-error_code) & _flag_mask if error_code < 0 and isfinite(error_code) else 0
+
+
+@functools.lru_cache(maxsize=256)
+def _decode_flags(error_code):
+    """Translate compressor error or warning status code to the flags that are set.
+
+    Args:
+        error_code: int: the error/warning code returned by the compressor.
+    Returns:
+        tuple: CompressorFlag for each flag set, most significant first. Empty if the code is not finite."""
+    bits = _flag_bits(error_code)
+    flags = []
+    while bits:
+        bit = bits & -bits
+        flags.append(CompressorFlag(bit))
+        bits ^= bit
+    return tuple(reversed(flags))
+
+
+@functools.lru_cache(maxsize=256)
 def _error_code_to_string(error_code):
     """Translate compressor error or warning status code to a human readable string.
 
@@ -44,108 +220,10 @@ def _error_code_to_string(error_code):
         error_code: int: the error/warning code returned by the compressor.
     Returns:
         str: error message."""
-    str_return = '   '
-    worker = error_code
-    if -1073741824 >= worker:
-        str_return += "Inverter Comm Loss, "
-        worker -= -1073741824
-    if -536870912 >= worker:
-        str_return += "Driver Comm Loss, "
-        worker -= -536870912
-    if -268435456 >= worker:
-        str_return += "Inverter Error, "
-        worker -= -268435456
-    if -134217728 >= worker:
-        str_return += "Motor Current High, "
-        worker -= -134217728
-    if -67108864 >= worker:
-        str_return += "Motor Current Sensor, "
-        worker -= -67108864
-    if -33554432 >= worker:
-        str_return += "Low Pressure Sensor, "
-        worker -= -33554432
-    if -16777216 >= worker:
-        str_return += "High Pressure Sensor, "
-        worker -= -16777216
-    if -8388608 >= worker:
-        str_return += "Oil Sensor, "
-        worker -= -8388608
-    if -4194304 >= worker:
-        str_return += "Helium Sensor, "
-        worker -= -4194304
-    if -2097152 >= worker:
-        str_return += "Coolant Out Sensor, "
-        worker -= -2097152
-    if -1048576 >= worker:
-        str_return += "Coolant In Sensor, "
-        worker -= -1048576
-    if -524288 >= worker:
-        str_return += "Motor Stall, "
-        worker -= -524288
-    if -262144 >= worker:
-        str_return += "Static Pressure Low, "
-        worker -= -262144
-    if -131072 >= worker:
-        str_return += "Static Pressure High, "
-        worker -= -131072
-    if -65536 >= worker:
-        str_return += "Power Supply Error, "
-        worker -= -65536
-    if -32768 >= worker:
-        str_return += "Three Phase Error, "
-        worker -= -32768
-    if -16384 >= worker:
-        str_return += "Motor Current Low, "
-        worker -= -16384
-    if -8192 >= worker:
-        str_return += "Delta Pressure Low, "
-        worker -= -8192
-    if -4096 >= worker:
-        str_return += "Delta Pressure High, "
-        worker -= -4096
-    if -2048 >= worker:
-        str_return += "High Pressure Low, "
-        worker -= -2048
-    if -1024 >= worker:
-        str_return += "High Pressure High, "
-        worker -= -1024
-    if -512 >= worker:
-        str_return += "Low Pressure Low, "
-        worker -= -512
-    if -256 >= worker:
-        str_return += "Low Pressure High, "
-        worker -= -256
-    if -128 >= worker:
-        str_return += "Helium Low, "
-        worker -= -128
-    if -64 >= worker:
-        str_return += "Helium High, "
-        worker -= -64
-    if -32 >= worker:
-        str_return += "Oil Low, "
-        worker -= -32
-    if -16 >= worker:
-        str_return += "Oil High, "
-        worker -= -16
-    if -8 >= worker:
-        str_return += "Coolant Out Low, "
-        worker -= -8
-    if -4 >= worker:
-        str_return += "Coolant Out High, "
-        worker -= -4
-    if -2 >= worker:
-        str_return += "Coolant In Low, "
-        worker -= -2
-    if -1 >= worker:
-        str_return += "Coolant In High, "
-        worker -= -1
-    # remove the final space & Comma if we have a message
-    if 0 < len(str_return.strip()):
-        str_return = str_return.strip()
-        str_return = str_return[0:len(str_return) - 1]
-    else:
-        str_return = 'None'
-    return str_return
+    flags = _decode_flags(error_code)
+    if not flags:
+        return 'None'
+    return ", ".join(_flag_messages[f] for f in flags)
 
 
 def _model_code_to_string(model_code):
@@ -220,86 +298,70 @@ def _model_code_to_string(model_code):
     return str_return
 
 
+@register_accessors(compressor_registers)
 class Compressor(object):
     """Class for communicating with the wSMA Compressor controller.
 
     The Compressor object wraps a pymodbus.ModbusTcpClient instance which
     communicates with the Compressor Digital Panel over TCP/IP.
     """
-    #: int: address of the controller's operating state register.
-    _operating_state_addr = 1
-
-    #: int: address of the controller's energized state register.
-    _enabled_addr = 2
-
-    #: int: address of the controller's warning register.
-    _warning_addr = 3
-
-    #: int: address of the controller's alarm/error register.
-    _error_addr = 5
-
-    #: int: address of the controller's Coolant In Temp(erature) register
-    _coolant_in_addr = 7
-
-    #: int: address of the controller's Coolant Out Temp(erature) register
-    _coolant_out_addr = 9
-
-    #: int: address of the controller's Oil Temp(erature) register
-    _oil_temp_addr = 11
+    #: RegisterMap: the registers of the Compressor Digital Panel
+    _registers = compressor_registers
 
-    #: int: address of the controller's Helium Temp(erature) register
-    _helium_temp_addr = 13
+    #: tuple: names of the values read by update()
+    _monitor_names = ('state_code', 'enabled', 'warning_code', 'error_code',
+                      'coolant_in', 'coolant_out', 'oil_temp', 'helium_temp',
+                      'low_pressure', 'low_pressure_average', 'high_pressure', 'high_pressure_average',
+                      'delta_pressure_average', 'motor_current', 'hours')
 
-    #: int: address of the controller's Low Pressure register
-    _low_press_addr = 15
+    #: frozenset: attributes holding the values read by update()
+    _monitor_attrs = frozenset(r.attr for r in compressor_registers.select(names=_monitor_names))
 
-    #: int: address of the controller's Low Pressure Average register
-    _low_press_avg_addr = 17
+    #: tuple: names of the values identifying the compressor, which are read once
+    _identity_names = ('pressure_scale', 'temperature_scale', 'serial', 'model', 'software_rev')
 
-    #: int: address of the controller's High Pressure register
-    _high_press_addr = 19
+    #: frozenset: attributes holding the values identifying the compressor
+    _identity_attrs = frozenset(r.attr for r in compressor_registers.select(names=_identity_names))
 
-    #: int: address of the controller's High Pressure Average register
-    _high_press_avg_addr = 21
+    #: tuple: states showing that the compressor has responded to being turned on
+    _on_states = (2, 3)
 
-    #: int: address of the controller's Delta Pressure Average register
-    _delta_press_avg_addr = 23
+    #: tuple: states showing that the compressor has responded to being turned off
+    _off_states = (5, 0)
 
-    #: int: address of the controller's Motor Current register
-    _motor_current_addr = 25
+    #: dict: functions converting the raw value of a register to the value stored by the Compressor
+    _converters = {
+        'model': lambda code: _model_code_to_string(code.to_bytes(2, byteorder="big")),
+        'software_rev': "{:.3f}".format,
+    }
 
-    #: int: address of the controller's Hours of Operation register
-    _hours_addr = 27
-
-    #: int: address of the controller's Pressure Scale register
-    _press_unit_addr = 29
-
-    #: int: address of the controller's Temperature Scale register
-    _temp_unit_addr = 30
-
-    #: int: address of the controller's Serial number register
-    _serial_addr = 31
-
-    #: int: address of the controller's Model number register
-    _model_addr = 32
-
-    #: int: address of the controller's Software rev register
-    _software_addr = 33
-
-    #: int: address of the controller's Enable/Disable holding register
-    _enable_addr = 1
-
-    def __init__(self, ip_address=default_IP, port=default_port):
+    def __init__(self, ip_address=default_IP, port=default_port, batch_update=True, timeout=default_timeout,
+                 pool=None, history=None, lazy=False, identity_cache=None, max_age=None,
+                 retry=None, instrument=False):
         """Create a Compressor object for communication with one Compressor Digital Panel controller.
 
         Opens a Modbus TCP connection to the Compressor Digital Panel controller at `ip_address`, and reads the
-        current state.
+        current state. If `lazy` is True, nothing is read until the first value is used.
 
         Args:
             ip_address (str): IP Address of the controller to communicate with
+            port (int): TCP port of the controller's Modbus server
+            batch_update (bool): If True, update() reads all of the monitored registers in a
+                single Modbus transaction. If False, each register is read separately.
+            timeout (float): Timeout in seconds for each Modbus transaction.
+            pool (ConnectionPool): Pool of connections to share the connection to the controller with other
+                objects. If True, the default pool is used. If None, the Compressor has its own connection.
+            history (int): If given, keep this many of the most recent readings made by update() in self.history.
+            lazy (bool): If True, do not communicate with the controller until a value is first used.
+            identity_cache (IdentityCache): Cache of the units, serial number, model and software revision, used
+                instead of reading them from the controller. If True, the default cache is used.
+            max_age (float): If given, properties refresh their values from the controller when they are
+                older than this many seconds.
+            retry (RetryPolicy): policy for retrying reads that get no response. Defaults to a new RetryPolicy().
+            instrument (bool): If True, record statistics of every request, returned by self.stats().
         """
-        #: (:obj:`ModbusTcpClient`): Client for communicating with the controller
-        self._client = ModbusTcpClient(ip_address, port=port)
+        #: (:obj:`ManagedClient`): Client for communicating with the controller
+        self._client = _managed_client(ip_address, port, timeout, pool)
 
         #: str: IP address and port of compressor.
         self._ip_address = ip_address
@@ -407,37 +469,92 @@ class Compressor(object):
         # bool: How much info should the Compressor return (particularly in __str__)
         self.verbose = False
 
-        # Get the values for the above attributes.
-        self.update()
+        # History: recent readings made by self.update(), or None if no history is kept
+        self.history = History(self._monitor_names, history) if history else None
 
-        # The following values are unlikely to change during operation, and so are not set by self.update()
+        # bool: Read all of the monitored registers in one transaction in self.update()
+        self.batch_update = batch_update
+
+        # int: maximum number of unwanted registers read by self.read() to join two values into one request
+        self.read_gap = default_max_gap
+
+        # float: maximum age in seconds of the values returned by properties, or None to never refresh them
+        self.max_age = max_age
+
+        #: RetryPolicy: retries and circuit breaker for reads from the controller
+        self.retry = retry if retry is not None else RetryPolicy()
 
-        # int: Pressure unit
+        #: RequestStats: statistics of the requests made, or None if they are not recorded
+        self.request_stats = RequestStats(self._registers) if instrument else None
+
+        # dict: monotonic time each value was last read, keyed by register name
+        self._read_times = {}
+        self._refresh_lock = threading.Lock()
+
+        # int: how long to wait before checking that compressor enable/disable
+        #       command worked
+        self._enable_delay = 1.0
+
+        # float: shortest interval between checks of the state while waiting for it to change
+        self._min_state_poll = 0.05
+
+        # Executor for commands run without waiting, created when first needed
+        self._executor = None
+
+        # IdentityCache: on-disk cache of the values below, or None
+        self._identity_cache = IdentityCache() if identity_cache is True else identity_cache
+
+        # The following values are unlikely to change during operation, and so are not set by self.update()
+        #
+        # int: self._press_scale: Pressure unit
         #       values are:
         #           0: PSI
         #           1: Bar
         #           2: KPA
-        self._press_scale = self.get_pressure_scale()
-
-        # int: Temperature unit
+        # int: self._temp_scale: Temperature unit
         #       values are:
         #           0: Farenheit
         #           1: Celsius
         #           2: Kelvin
-        self._temp_scale = self.get_temperature_scale()
-
-        # str: Serial Number
-        self._serial = self.get_serial()
+        # str: self._serial: Serial Number
+        # str: self._model: Model number
+        # str: self._software_rev: Software rev
+        cached = self._identity_cache.get(self._cache_key) if self._identity_cache is not None else None
+        if cached:
+            for name in self._identity_names:
+                setattr(self, self._registers[name].attr, cached[name])
+
+        if lazy:
+            # Remove the placeholder values, so that they are read from the controller when first used
+            for attr in self._monitor_attrs:
+                del self.__dict__[attr]
+        else:
+            # Get the values for the above attributes.
+            self.update()
+            if not cached:
+                self._load_identity()
 
-        # str: Model number
-        self._model = self.get_model()
+    def __getattr__(self, name):
+        """Read values that have not been read yet from a lazily constructed Compressor."""
+        if name in self._monitor_attrs:
+            self.update()
+        elif name in self._identity_attrs:
+            self._load_identity()
+        else:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+        return self.__dict__[name]
 
-        # str: Software rev
-        self._software_rev = self.get_software_rev()
+    @property
+    def _cache_key(self):
+        """str: key of the compressor in the identity cache."""
+        return "{}:{}".format(self._ip_address, self._port)
 
-        # int: how long to wait before checking that compressor enable/disable
-        #       command worked
-        self._enable_delay = 1.0
+    def _load_identity(self):
+        """Read the units, serial number, model and software revision in one request, and cache them."""
+        self._read_values(self._identity_names, max_gap=0)
+        if self._identity_cache is not None:
+            self._identity_cache.put(self._cache_key,
+                                     dict((n, getattr(self, self._registers[n].attr)) for n in self._identity_names))
 
     @property
     def state_code(self):
@@ -452,20 +569,12 @@ class Compressor(object):
                     8: Helium cool down
                     9: Power related error
                     15: Recovered from error"""
-        return self._state
+        return self._value('state_code')
 
     @property
     def state(self):
         """str: Verbose description of state of the compressor"""
-        return _status_to_string(self._state)
-
-    @property
-    def enabled(self):
-        """int: Enable state of the compressor.
-            values are one of:
-                0: Off
-                1: On"""
-        return self._enabled
+        return _status_to_string(self._value('state_code'))
 
     @property
     def warning_code(self):
@@ -490,12 +599,17 @@ class Compressor(object):
                 -262144: Static Pressure running Low
                 -524288: Cold head motor stall
         """
-        return self._warning_code
+        return self._value('warning_code')
 
     @property
     def warnings(self):
         """str: String containing all current warnings as comma separated list."""
-        return _error_code_to_string(self._warning_code)
+        return _error_code_to_string(self._value('warning_code'))
+
+    @property
+    def warning_flags(self):
+        """tuple: CompressorFlag for each current warning, most significant first."""
+        return _decode_flags(self._value('warning_code'))
 
     @property
     def error_code(self):
@@ -523,12 +637,17 @@ class Compressor(object):
                 -262144: Static Pressure running Low
                 -524288: Cold head motor stall
         """
-        return self._error_code
+        return self._value('error_code')
 
     @property
     def errors(self):
         """str: Verbose error messages as comma separated list."""
-        return _error_code_to_string(self._error_code)
+        return _error_code_to_string(self._value('error_code'))
+
+    @property
+    def error_flags(self):
+        """tuple: CompressorFlag for each current error, most significant first."""
+        return _decode_flags(self._value('error_code'))
 
     @property
     def temp_unit(self):
@@ -548,61 +667,6 @@ class Compressor(object):
             str_return = 'kPa'
         return str_return
 
-    @property
-    def coolant_in(self):
-        """float: Coolant IN temperature in self.temp_units"""
-        return self._coolant_in
-
-    @property
-    def coolant_out(self):
-        """float: Coolant OUT temperature in self.temp_units"""
-        return self._coolant_out
-
-    @property
-    def oil_temp(self):
-        """float: Oil temperature in self.temp_units"""
-        return self._oil_temp
-
-    @property
-    def helium_temp(self):
-        """float: Helium temperature in self.temp_units"""
-        return self._helium_temp
-
-    @property
-    def low_pressure(self):
-        """float: Low side pressure in self.press_units"""
-        return self._low_press
-
-    @property
-    def low_pressure_average(self):
-        """float: Average low side pressure in self.press_units"""
-        return self._low_press_avg
-
-    @property
-    def high_pressure(self):
-        """float: High side pressure in self.press_units"""
-        return self._high_press
-
-    @property
-    def high_pressure_average(self):
-        """float: Average high side pressure in self.press_units"""
-        return self._high_press_avg
-
-    @property
-    def delta_pressure_average(self):
-        """float: Average pressure delta in self.press_units"""
-        return self._delta_press_avg
-
-    @property
-    def motor_current(self):
-        """float: Motor current in Amps"""
-        return self._motor_current
-
-    @property
-    def hours(self):
-        """float: Hours of operation"""
-        return self._hours
-
     @property
     def serial(self):
         """str: Serial number of the compressor"""
@@ -632,17 +696,167 @@ class Compressor(object):
 
         Returns:
             float: Python float read from the register."""
-        r = self._client.read_input_registers(addr, count=2)
+        try:
+            r = self.retry.call(self._read_input_registers, addr, 2)
+        except ModbusIOException:
+            raise RuntimeError("Could not read register {}".format(addr))
         if r.isError():
             raise RuntimeError("Could not read register {}".format(addr))
         else:
-            decoder = BinaryPayloadDecoder.fromRegisters(r.registers, byteorder=Endian.Big, wordorder=Endian.Little)
-            result = decoder.decode_32bit_float()
+            return _float32_decoder.decode(r.registers)[0]
+
+    def _read_input_registers(self, addr, count):
+        """Read input registers, raising ModbusIOException if the controller does not respond.
+
+        The request is sent once, with a timeout limited to the time left before the deadline of
+        self.retry, which decides whether it is repeated."""
+        r = timed_request(self.request_stats, self._client, 'read_input_registers', addr, count, count=count,
+                          resend=False, timeout=self.retry.remaining())
+        if isinstance(r, ModbusIOException):
+            raise r
+        return r
+
+    def _read_block(self, addr, count):
+        """Read a contiguous block of input registers from the compressor.
 
-            return result
+        Args:
+            addr (int): Address of the first register to read.
+            count (int): Number of registers to read.
+
+        Returns:
+            list: the raw 16 bit register values."""
+        try:
+            r = self.retry.call(self._read_input_registers, addr, count)
+        except ModbusIOException:
+            raise RuntimeError("Could not read registers {} to {}".format(addr, addr + count - 1))
+        if r.isError():
+            raise RuntimeError("Could not read registers {} to {}".format(addr, addr + count - 1))
+        else:
+            return r.registers
+
+    def _read_register(self, register):
+        """Read the value of one register from the compressor.
+
+        Args:
+            register (Register): description of the register to read.
+
+        Returns:
+            the raw value of the register."""
+        r = self._read_block(register.address, register.width)
+        return self._registers.decoder((register.name,)).decode(r)[0]
 
     def update(self):
-        """Read current values from all input registers."""
+        """Read current values from all input registers.
+
+        If self.batch_update is True, all of the values are read in a single Modbus transaction,
+        otherwise each value is read with its own request. If a history is being kept, the values
+        are added to it."""
+        if self.batch_update:
+            self._update_block()
+        else:
+            self._update_each()
+        if self.history is not None:
+            self.history.append(time(), [getattr(self, name) for name in self._monitor_names])
+
+    def _update_block(self):
+        """Read all of the monitored input registers in one transaction and decode each value."""
+        self._read_values(self._monitor_names, self.read_gap)
+
+    def _read_values(self, names, max_gap):
+        """Read the named values with the fewest requests, and store them.
+
+        Args:
+            names (iterable): names of the registers to read.
+            max_gap (int): maximum number of unwanted registers read to join two values into one request.
+
+        Returns:
+            list: the Registers read."""
+        read = []
+        for span, decoder in self._registers.plan(names, max_gap=max_gap):
+            if span.kind != 'input':
+                raise ValueError("Cannot read {} registers {}".format(span.kind, ", ".join(span.names)))
+            r = self._read_block(span.start, span.count)
+            now = monotonic()
+            for name, value in zip(decoder.names, decoder.decode(r)):
+                register = self._registers[name]
+                if name in self._converters:
+                    value = self._converters[name](value)
+                setattr(self, register.attr, value)
+                self._read_times[name] = now
+                read.append(register)
+        return read
+
+    def stats(self):
+        """Return statistics of the requests made to the controller.
+
+        Returns:
+            dict: the RequestStats summary of each block of registers under 'requests', empty unless the
+            Compressor was created with instrument=True, the RetryPolicy counters under 'retry', and
+            the number of times the connection has been reopened under 'reconnects'."""
+        return {'requests': self.request_stats.summary() if self.request_stats is not None else [],
+                'retry': self.retry.counters(),
+                'reconnects': getattr(self._client, 'reconnects', 0)}
+
+    def _value(self, name):
+        """Return the stored raw value of a register.
+
+        If self.max_age is set and the value is older than that, the value and any other stale values
+        read by update() are first refreshed from the controller together.
+
+        Args:
+            name (str): name of the register.
+
+        Returns:
+            the stored raw value."""
+        if self.max_age is not None and name in self._monitor_names:
+            self._refresh_stale(name)
+        return getattr(self, self._registers[name].attr)
+
+    def _refresh_stale(self, name):
+        """Refresh the named value and the other stale monitored values if the named value is stale."""
+        if monotonic() - self._read_times.get(name, -inf) <= self.max_age:
+            return
+        # Only one thread refreshes, the others wait for and then use its result
+        with self._refresh_lock:
+            now = monotonic()
+            if now - self._read_times.get(name, -inf) <= self.max_age:
+                return
+            stale = [n for n in self._monitor_names if now - self._read_times.get(n, -inf) > self.max_age]
+            self._read_values(stale, self.read_gap)
+
+    def age(self, name):
+        """Return the time since a value was last read from the controller.
+
+        Args:
+            name (str): name of the value, e.g. 'helium_temp'.
+
+        Returns:
+            float: age of the value in seconds, or None if it has not been read."""
+        t = self._read_times.get(name)
+        return None if t is None else monotonic() - t
+
+    def read(self, fields=None, max_gap=None):
+        """Read a group of values from the compressor using as few requests as possible.
+
+        Registers close to each other are read together in one request, as long as the gap between
+        them is at most `max_gap` registers. The values read are also stored, so the corresponding
+        properties are updated.
+
+        Args:
+            fields (iterable): names of the values to read, e.g. ['helium_temp', 'high_pressure', 'state_code'].
+                Defaults to all of the values read by update().
+            max_gap (int): maximum number of unwanted registers read to join two values. Defaults to self.read_gap.
+
+        Returns:
+            dict: the values read, keyed by name."""
+        if fields is None:
+            fields = self._monitor_names
+        if max_gap is None:
+            max_gap = self.read_gap
+        return dict((r.name, r.value(getattr(self, r.attr))) for r in self._read_values(fields, max_gap))
+
+    def _update_each(self):
+        """Read each of the monitored input registers with a separate request."""
         self._get_state()
         self._get_enabled()
         self._get_errors()
@@ -658,6 +872,9 @@ class Compressor(object):
         self._get_delta_pressure_average()
         self._get_motor_current()
         self._get_hours()
+        now = monotonic()
+        for name in self._monitor_names:
+            self._read_times[name] = now
 
     def __str__(self):
         """Print the stored state of the compressor."""
@@ -693,6 +910,33 @@ class Compressor(object):
                           "Motor current      : {:.2f} Amps".format(self.motor_current),
                           "Hours of Operation : {:.1f}".format(self.hours)))
 
+    def stream(self, interval=1.0, fields=None, count=None):
+        """Read values from the compressor at a fixed cadence.
+
+        Each reading is started on a fixed schedule, so the time taken to read does not cause the
+        cadence to drift. If a reading takes longer than `interval`, the missed readings are skipped.
+
+        Args:
+            interval (float): time between readings in seconds. If 0, each reading starts as soon as the last ends.
+            fields (iterable): names of the values to read, see read(). Defaults to the values read by update().
+            count (int): number of readings to make, or None to continue indefinitely.
+
+        Yields:
+            dict: the Unix time of the reading under 'time', and the values read, keyed by name."""
+        fields = tuple(fields) if fields is not None else self._monitor_names
+        deadline = monotonic()
+        n = 0
+        while True:
+            record = {'time': time()}
+            record.update(self.read(fields))
+            yield record
+            n += 1
+            if count is not None and n >= count:
+                break
+            now = monotonic()
+            deadline = _next_deadline(deadline, interval, now)
+            sleep(deadline - now)
+
     def print_status(self):
         """Print all of the stored status"""
         print(self.status)
@@ -710,7 +954,10 @@ class Compressor(object):
 
     def _get_state(self):
         """Read the current state of the compressor."""
-        r = self._client.read_input_registers(self._operating_state_addr)
+        try:
+            r = self.retry.call(self._read_input_registers, self._registers['state_code'].address, 1)
+        except ModbusIOException:
+            raise RuntimeError("Could not get current state")
         if r.isError():
             raise RuntimeError("Could not get current state")
         else:
@@ -724,25 +971,9 @@ class Compressor(object):
         self._get_state()
         return self.state
 
-    def _get_enabled(self):
-        """Read the current Enable state of the compressor"""
-        r = self._client.read_input_registers(self._enabled_addr)
-        if r.isError():
-            raise RuntimeError("Could not get current enabled state")
-        else:
-            self._enabled = r.registers[0]
-
-    def get_enabled(self):
-        """Read the current Enable state of the compressor.
-
-        Returns:
-            int: current Enable state of the compressor."""
-        self._get_enabled()
-        return self.enabled
-
     def _get_warnings(self):
         """Read the current warnings from the compressor."""
-        r = self._read_float32(self._warning_addr)
+        r = self._read_register(self._registers['warning_code'])
         self._warning_code = r
 
     def get_warnings(self):
@@ -755,7 +986,7 @@ class Compressor(object):
 
     def _get_errors(self):
         """Read the current errors from the compressor."""
-        r = self._read_float32(self._error_addr)
+        r = self._read_register(self._registers['error_code'])
         self._error_code = r
 
     def get_errors(self):
@@ -766,158 +997,15 @@ class Compressor(object):
         self._get_errors()
         return self.errors
 
-    def _get_coolant_in(self):
-        """Read the current coolant inlet temperature."""
-        temp = self._read_float32(self._coolant_in_addr)
-        self._coolant_in = temp
-
-    def get_coolant_in(self):
-        """Read the current coolant inlet temperature.
-
-        Returns:
-            float: coolant inlet temperature in units of self.temp_units"""
-        self._get_coolant_in()
-        return self.coolant_in
-
-    def _get_coolant_out(self):
-        """Read the current coolant outlet temperature"""
-        temp = self._read_float32(self._coolant_out_addr)
-        self._coolant_out = temp
-
-    def get_coolant_out(self):
-        """Read the current coolant outlet temperature.
-
-        Returns:
-            float: coolant inlet temperature in units of self.temp_units"""
-        self._get_coolant_out()
-        return self.coolant_out
-
-    def _get_helium_temp(self):
-        """Read the current helium temperature."""
-        temp = self._read_float32(self._helium_temp_addr)
-        self._helium_temp = temp
-
-    def get_helium_temp(self):
-        """Read the current helium temperature.
-
-        Returns:
-            float: helium temperature in units of self.temp_units"""
-        self._get_helium_temp()
-        return self.helium_temp
-
-    def _get_oil_temp(self):
-        """Read the current helium temperature."""
-        temp = self._read_float32(self._oil_temp_addr)
-        self._oil_temp = temp
-
-    def get_oil_temp(self):
-        """Read the current helium temperature.
-
-        Returns:
-            float: helium temperature in units of self.temp_units"""
-        self._get_oil_temp()
-        return self.oil_temp
-
-    def _get_low_pressure(self):
-        """Read the current low side pressure."""
-        temp = self._read_float32(self._low_press_addr)
-        self._low_press = temp
-
-    def get_low_pressure(self):
-        """Read the current low side pressure.
-
-        Returns:
-            float: low side pressure in units of self.press_units"""
-        self._get_low_pressure()
-        return self.low_pressure
-
-    def _get_low_pressure_average(self):
-        """Read the current average low side pressure."""
-        temp = self._read_float32(self._low_press_avg_addr)
-        self._low_press_avg = temp
-
-    def get_low_pressure_average(self):
-        """Read the current average low side pressure.
-
-        Returns:
-            float: average low side pressure in units of self.press_units"""
-        self._get_low_pressure_average()
-        return self.low_pressure_average
-
-    def _get_high_pressure(self):
-        """Read the current high side pressure."""
-        temp = self._read_float32(self._high_press_addr)
-        self._high_press = temp
-
-    def get_high_pressure(self):
-        """Read the current high side pressure.
-
-        Returns:
-            float: high side pressure in units of self.press_units"""
-        self._get_high_pressure()
-        return self.high_pressure
-
-    def _get_high_pressure_average(self):
-        """Read the current average high side pressure."""
-        temp = self._read_float32(self._high_press_avg_addr)
-        self._high_press_avg = temp
-
-    def get_high_pressure_average(self):
-        """Read the current average high side pressure.
-
-        Returns:
-            float: average high side pressure in units of self.press_units"""
-        self._get_high_pressure_average()
-        return self.high_pressure_average
-
-    def _get_delta_pressure_average(self):
-        """Read the current average pressure delta."""
-        temp = self._read_float32(self._delta_press_avg_addr)
-        self._delta_press_avg = temp
-
-    def get_delta_pressure_average(self):
-        """Read the current average pressure delta.
-
-        Returns:
-            float: average pressure delta in units of self.press_units"""
-        self._get_delta_pressure_average()
-        return self.delta_pressure_average
-
-    def _get_motor_current(self):
-        """Read the motor current."""
-        temp = self._read_float32(self._motor_current_addr)
-        self._motor_current = temp
-
-    def get_motor_current(self):
-        """Read the motor current.
-
-        ! This number is known to be garbage on the inverter compressors !
-        Use the RS485 bus on the inverter unit to read the current/voltage/power consumption
-
-        Returns:
-            float: motor current in Amps"""
-        self._get_motor_current()
-        return self.motor_current
-
-    def _get_hours(self):
-        """Read the current hours of operation."""
-        temp = self._read_float32(self._hours_addr)
-        self._hours = temp
-
-    def get_hours(self):
-        """Read the current hours of operation.
-
-        Returns:
-            float: hours of operation"""
-        self._get_hours()
-        return self.hours
-
     def get_pressure_scale(self):
         """Read the pressure scale.
 
         Returns:
             int: the pressure scale code."""
-        r = self._client.read_input_registers(self._press_unit_addr)
+        try:
+            r = self.retry.call(self._read_input_registers, self._registers['pressure_scale'].address, 1)
+        except ModbusIOException:
+            raise RuntimeError("Could not get pressure units")
         if r.isError():
             raise RuntimeError("Could not get pressure units")
         else:
@@ -929,7 +1017,10 @@ class Compressor(object):
 
         Returns:
             int: the temperature scale code."""
-        r = self._client.read_input_registers(self._temp_unit_addr)
+        try:
+            r = self.retry.call(self._read_input_registers, self._registers['temperature_scale'].address, 1)
+        except ModbusIOException:
+            raise RuntimeError("Could not get temperature units")
         if r.isError():
             raise RuntimeError("Could not get temperature units")
         else:
@@ -941,8 +1032,7 @@ class Compressor(object):
 
         Returns:
             str: model name from the compressor"""
-        r = self._client.read_input_registers(self._serial_addr)
-        self._serial = r.registers[0]
+        self._serial = self._read_block(self._registers['serial'].address, 1)[0]
         return self.serial
 
     def get_model(self):
@@ -950,8 +1040,7 @@ class Compressor(object):
 
         Returns:
             str: model name from the compressor"""
-        r = self._client.read_input_registers(self._model_addr)
-        model = _model_code_to_string(r.registers[0].to_bytes(2, byteorder="big"))
+        model = self._converters['model'](self._read_block(self._registers['model'].address, 1)[0])
         self._model = model
         return self.model
 
@@ -960,38 +1049,107 @@ class Compressor(object):
 
         Returns:
             str: software revision"""
-        s = self._read_float32(self._software_addr)
-        software = "{:.3f}".format(s)
+        s = self._read_float32(self._registers['software_rev'].address)
+        software = self._converters['software_rev'](s)
         self._software_rev = software
         return self.software_rev
 
-    def on(self):
-        """Turn the compressor on."""
-        w = self._client.write_registers(self._enable_addr, 0x0001)
-        if w.isError():
-            raise RuntimeError("Could not command compressor to turn on")
-        else:
-            sleep(self._enable_delay)
-            self._get_state()
-            # give it some more time if needed
-            if self._state != 2 and self._state != 3:
-                sleep(self._enable_delay)
-            if self._state != 2 and self._state != 3:
-                self._get_errors()
-                raise RuntimeError("Compressor is not starting. Compressor Error Code {}".format(self._error_code))
-            self.update()
+    def _write_enable(self, value, action):
+        """Write to the Enable/Disable holding register.
 
-    def off(self):
-        """Turn the compressor off."""
-        w = self._client.write_registers(self._enable_addr, 0x00FF)
+        Args:
+            value (int): 0x0001 to turn the compressor on, 0x00FF to turn it off.
+            action (str): 'on' or 'off', for the error message."""
+        w = timed_request(self.request_stats, self._client, 'write_registers', self._registers['enable'].address, 1, value)
         if w.isError():
-            raise RuntimeError("Could not command compressor to turn off")
-        else:
-            sleep(self._enable_delay)
+            raise RuntimeError("Could not command compressor to turn {}".format(action))
+
+    def _wait_for_states(self, states, timeout):
+        """Poll the state register until the compressor reaches one of `states`.
+
+        The state is first checked after self._min_state_poll seconds, and the interval between
+        checks doubles up to self._enable_delay, so that fast transitions are seen quickly.
+
+        Args:
+            states (tuple): the states to wait for.
+            timeout (float): maximum time to wait in seconds.
+
+        Returns:
+            bool: True if the compressor reached one of the states."""
+        deadline = monotonic() + timeout
+        for interval in _poll_intervals(self._min_state_poll, self._enable_delay):
+            now = monotonic()
+            if now >= deadline:
+                return False
+            sleep(min(interval, deadline - now))
             self._get_state()
-            # Give it some more time if needed
-            if self._state != 5 and self._state != 0:
-                sleep(self._enable_delay)
-            if self._state != 5 and self._state != 0:
-                raise RuntimeError("Compressor did not turn off")
-            self.update()
+            if self._state in states:
+                return True
+
+    def _turn_on(self, timeout):
+        """Turn the compressor on and wait for it to start.
+
+        Returns:
+            int: the state code once the compressor is starting or running."""
+        self._write_enable(0x0001, 'on')
+        if not self._wait_for_states(self._on_states, timeout):
+            self._get_errors()
+            raise RuntimeError("Compressor is not starting. Compressor Error Code {}".format(self._error_code))
+        self.update()
+        return self._state
+
+    def _turn_off(self, timeout):
+        """Turn the compressor off and wait for it to stop.
+
+        Returns:
+            int: the state code once the compressor is stopping or stopped."""
+        self._write_enable(0x00FF, 'off')
+        if not self._wait_for_states(self._off_states, timeout):
+            raise RuntimeError("Compressor did not turn off")
+        self.update()
+        return self._state
+
+    def _submit(self, func, *args):
+        """Run a call on the Compressor's command thread.
+
+        Returns:
+            concurrent.futures.Future: future resolving to the return value of the call."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        return self._executor.submit(func, *args)
+
+    def on(self, wait=True, timeout=None):
+        """Turn the compressor on.
+
+        Args:
+            wait (bool): If True, block until the compressor is starting. If False, return immediately
+                with a future.
+            timeout (float): maximum time to wait for the compressor to start, in seconds.
+                Defaults to twice self._enable_delay.
+
+        Returns:
+            int: the state code if `wait` is True, otherwise a concurrent.futures.Future that resolves
+            to the state code once the compressor is starting or running, or raises RuntimeError."""
+        if timeout is None:
+            timeout = 2 * self._enable_delay
+        if wait:
+            return self._turn_on(timeout)
+        return self._submit(self._turn_on, timeout)
+
+    def off(self, wait=True, timeout=None):
+        """Turn the compressor off.
+
+        Args:
+            wait (bool): If True, block until the compressor is stopping. If False, return immediately
+                with a future.
+            timeout (float): maximum time to wait for the compressor to stop, in seconds.
+                Defaults to twice self._enable_delay.
+
+        Returns:
+            int: the state code if `wait` is True, otherwise a concurrent.futures.Future that resolves
+            to the state code once the compressor is stopping or stopped, or raises RuntimeError."""
+        if timeout is None:
+            timeout = 2 * self._enable_delay
+        if wait:
+            return self._turn_off(timeout)
+        return self._submit(self._turn_off, timeout)
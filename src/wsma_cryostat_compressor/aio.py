@@ -0,0 +1,204 @@
+"""
+asyncio clients for the Compressor and Inverter.
+
+AsyncCompressor and AsyncInverter wrap the blocking Compressor and Inverter objects, running each
+Modbus transaction in an executor and waiting with asyncio.sleep() rather than time.sleep(), so
+that many devices can be polled and commanded concurrently from one event loop.
+
+pymodbus <= 2.5.3, which this package requires, has an asyncio client that no longer runs on
+current versions of Python, so the blocking client is used in worker threads instead.
+"""
+__version__ = '0.1.1'
+
+import asyncio
+import functools
+from time import monotonic, time
+
+import wsma_cryostat_compressor
+import wsma_cryostat_compressor.inverter
+
+
+class _AsyncDevice(object):
+    """Base class for asyncio wrappers around a blocking device object.
+
+    Attributes not defined by the wrapper, such as the properties of the device, are read from
+    the wrapped device object once it has been connected.
+    """
+    #: type: class of the wrapped device
+    _device_class = None
+
+    def __init__(self, *args, executor=None, **kwargs):
+        """Create the wrapper. No communication takes place until connect() is awaited.
+
+        Args:
+            args: positional arguments for the device class.
+            executor (concurrent.futures.Executor): executor to run blocking calls in.
+                Defaults to the event loop's default executor.
+            kwargs: keyword arguments for the device class.
+        """
+        self._args = args
+        self._kwargs = kwargs
+        self._executor = executor
+        self._device = None
+
+    def __getattr__(self, name):
+        device = self.__dict__.get('_device')
+        if device is None:
+            raise AttributeError("{} has no attribute {} (is it connected?)".format(type(self).__name__, name))
+        return getattr(device, name)
+
+    async def _call(self, func, *args, **kwargs):
+        """Run a blocking call in the executor.
+
+        Args:
+            func (callable): the function to call.
+
+        Returns:
+            the return value of func."""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def connect(self):
+        """Create the wrapped device object, reading its initial state.
+
+        Returns:
+            the wrapper, so that `device = await AsyncCompressor(...).connect()` can be used."""
+        if self._device is None:
+            self._device = await self._call(self._device_class, *self._args, **self._kwargs)
+        return self
+
+    @property
+    def device(self):
+        """The wrapped blocking device object."""
+        return self._device
+
+    async def update(self):
+        """Read current values from the device."""
+        await self._call(self._device.update)
+
+    def close(self):
+        """Close the connection to the device."""
+        if self._device is not None:
+            self._device._client.close()
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class AsyncCompressor(_AsyncDevice):
+    """asyncio client for the Compressor Digital Panel.
+
+    Takes the same arguments as Compressor, plus an optional executor."""
+    _device_class = wsma_cryostat_compressor.Compressor
+
+    async def read(self, fields=None, max_gap=None):
+        """Read a group of values from the compressor, see Compressor.read().
+
+        Returns:
+            dict: the values read, keyed by name."""
+        return await self._call(self._device.read, fields, max_gap)
+
+    async def stream(self, interval=1.0, fields=None, count=None):
+        """Read values from the compressor at a fixed cadence, see Compressor.stream().
+
+        Args:
+            interval (float): time between readings in seconds.
+            fields (iterable): names of the values to read. Defaults to the values read by update().
+            count (int): number of readings to make, or None to continue indefinitely.
+
+        Yields:
+            dict: the Unix time of the reading under 'time', and the values read, keyed by name."""
+        fields = tuple(fields) if fields is not None else self._device._monitor_names
+        deadline = monotonic()
+        n = 0
+        while True:
+            record = {'time': time()}
+            record.update(await self.read(fields))
+            yield record
+            n += 1
+            if count is not None and n >= count:
+                break
+            now = monotonic()
+            deadline = wsma_cryostat_compressor._next_deadline(deadline, interval, now)
+            await asyncio.sleep(deadline - now)
+
+    async def _wait_for_state(self, states, timeout):
+        """Poll the state register until the compressor reaches one of `states`.
+
+        Polls quickly at first, backing off as Compressor.on() does.
+
+        Returns:
+            bool: True if the compressor reached one of the states."""
+        comp = self._device
+        deadline = monotonic() + timeout
+        for interval in wsma_cryostat_compressor._poll_intervals(comp._min_state_poll, comp._enable_delay):
+            now = monotonic()
+            if now >= deadline:
+                return False
+            await asyncio.sleep(min(interval, deadline - now))
+            await self._call(comp._get_state)
+            if comp.state_code in states:
+                return True
+
+    async def on(self, timeout=None):
+        """Turn the compressor on, returning once it is starting.
+
+        Args:
+            timeout (float): maximum time to wait in seconds. Defaults to twice the Compressor's enable delay.
+
+        Returns:
+            int: the state code."""
+        comp = self._device
+        await self._call(comp._write_enable, 0x0001, 'on')
+        if not await self._wait_for_state(comp._on_states, timeout or 2 * comp._enable_delay):
+            await self._call(comp._get_errors)
+            raise RuntimeError("Compressor is not starting. Compressor Error Code {}".format(comp.error_code))
+        await self.update()
+        return comp.state_code
+
+    async def off(self, timeout=None):
+        """Turn the compressor off, returning once it is stopping.
+
+        Args:
+            timeout (float): maximum time to wait in seconds. Defaults to twice the Compressor's enable delay.
+
+        Returns:
+            int: the state code."""
+        comp = self._device
+        await self._call(comp._write_enable, 0x00FF, 'off')
+        if not await self._wait_for_state(comp._off_states, timeout or 2 * comp._enable_delay):
+            raise RuntimeError("Compressor did not turn off")
+        await self.update()
+        return comp.state_code
+
+
+class AsyncInverter(_AsyncDevice):
+    """asyncio client for the inverter.
+
+    Takes the same arguments as Inverter, plus an optional executor."""
+    _device_class = wsma_cryostat_compressor.inverter.Inverter
+
+    async def set_frequency(self, freq):
+        """Set the inverter frequency.
+
+        Args:
+            freq: float: Inverter frequency in Hz.
+
+        Returns:
+            float: the frequency read back from the inverter in Hz."""
+        f = wsma_cryostat_compressor.inverter._frequency_code(freq)
+        inv = self._device
+        await self._call(inv._write_frequency, f)
+        await asyncio.sleep(inv._set_delay)
+        await self._call(inv._get_frequency)
+        return inv.frequency
+
+    async def get_frequency(self):
+        """Get current frequency from the inverter and return the value.
+
+        Returns:
+            float: Frequency in Hz."""
+        return await self._call(self._device.get_frequency)
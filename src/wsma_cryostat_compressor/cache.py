@@ -0,0 +1,98 @@
+"""
+On-disk cache of the identity of compressors.
+
+The serial number, model, software revision and units of a compressor do not change during
+operation. IdentityCache stores them in a small JSON file, keyed by the address of the
+compressor, so that new Compressor objects can skip reading them.
+"""
+__version__ = '0.1.1'
+
+import json
+import os
+import threading
+from time import time
+
+#: float: default time in seconds for which cached identities are used
+default_identity_ttl = 24 * 3600.0
+
+
+def default_cache_path():
+    """Return the default path of the identity cache file.
+
+    Returns:
+        str: path in $XDG_CACHE_HOME, or ~/.cache if that is not set."""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'wsma_cryostat_compressor', 'identity.json')
+
+
+class IdentityCache(object):
+    """JSON file cache of compressor identities, with a time to live.
+
+    The cache is best effort: errors reading or writing the file are ignored.
+    """
+    def __init__(self, path=None, ttl=default_identity_ttl):
+        """Create the cache.
+
+        Args:
+            path (str): path of the cache file. Defaults to default_cache_path().
+            ttl (float): time in seconds for which cached identities are used.
+        """
+        self.path = path if path is not None else default_cache_path()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def get(self, key):
+        """Return the cached identity of a device.
+
+        Args:
+            key (str): the address of the device.
+
+        Returns:
+            dict: the cached values, or None if there are none or they have expired."""
+        with self._lock:
+            entry = self._load().get(key)
+        if not entry or time() - entry.get('time', 0) > self.ttl:
+            return None
+        return entry.get('values')
+
+    def put(self, key, values):
+        """Store the identity of a device.
+
+        Args:
+            key (str): the address of the device.
+            values (dict): the values to store.
+        """
+        with self._lock:
+            data = self._load()
+            data[key] = {'time': time(), 'values': values}
+            tmp = "{}.{}.tmp".format(self.path, os.getpid())
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(tmp, 'w') as f:
+                    json.dump(data, f)
+                os.replace(tmp, self.path)
+            except OSError:
+                pass
+
+    def clear(self, key=None):
+        """Remove one device, or all devices, from the cache.
+
+        Args:
+            key (str): the address of the device, or None to remove all devices.
+        """
+        with self._lock:
+            data = self._load() if key is not None else {}
+            data.pop(key, None)
+            try:
+                with open(self.path, 'w') as f:
+                    json.dump(data, f)
+            except OSError:
+                pass
@@ -17,10 +17,29 @@ Why does this file exist, and why not put this in __main__?
 __version__ = '0.1.1'
 
 import argparse
+import csv
+import json
+import sys
+from time import monotonic, sleep
+
 import wsma_cryostat_compressor
+from wsma_cryostat_compressor.simulator import ModbusSimulator, SimulatedCompressor
+from wsma_cryostat_compressor.stats import format_stats
 
 default_ip = '192.168.42.12'
 
+
+def _positive_float(text):
+    """Parse a time interval argument, which must be greater than 0."""
+    try:
+        value = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid float value: {!r}".format(text))
+    if not value > 0:
+        raise argparse.ArgumentTypeError("must be greater than 0: {!r}".format(text))
+    return value
+
+
 parser = argparse.ArgumentParser(description="Communicate with a Cryomech compressor's "
                                              "digital control panel.")
 
@@ -28,22 +47,104 @@ parser.add_argument("-v", "--verbosity", action="store_true",
                     help="Display detailed output from compressor")
 parser.add_argument("-a", "--address", default=default_ip,
                     help="The IP address of the compressor")
+parser.add_argument("--stats", action="store_true",
+                    help="Print statistics of the requests made to the compressor")
+parser.add_argument("-w", "--watch", type=_positive_float, metavar="INTERVAL",
+                    help="Keep reading the compressor every INTERVAL seconds")
+parser.add_argument("-n", "--count", type=int,
+                    help="Number of readings to make in watch mode. Defaults to reading until interrupted")
+parser.add_argument("-f", "--format", choices=('text', 'json', 'csv'), default='text',
+                    help="Output format. json and csv write one line per reading")
+parser.add_argument("--fields",
+                    help="Comma separated names of the values written in json or csv format")
 group = parser.add_mutually_exclusive_group()
 group.add_argument("--on", action="store_true", help="Turn the compressor on")
 group.add_argument("--off", action="store_true", help="Turn the compressor off")
 
 
+def _redraw(previous, lines):
+    """Return the terminal output that changes the displayed `previous` lines to `lines`.
+
+    Only lines that have changed are rewritten, unless the number of lines has changed."""
+    if previous is None:
+        return "\n".join(lines) + "\n"
+    if len(previous) != len(lines):
+        return "\x1b[{}A\r\x1b[J".format(len(previous)) + "\n".join(lines) + "\n"
+    out = []
+    for i, (old, new) in enumerate(zip(previous, lines)):
+        if old != new:
+            up = len(lines) - i
+            out.append("\x1b[{}A\r\x1b[2K{}\x1b[{}B\r".format(up, new, up))
+    return "".join(out)
+
+
+def _watch_text(comp, interval, count, out):
+    """Display the status of the compressor, updating it in place every `interval` seconds."""
+    tty = out.isatty()
+    previous = None
+    deadline = monotonic()
+    n = 0
+    while True:
+        comp.update()
+        lines = comp.status.splitlines()
+        if tty:
+            out.write(_redraw(previous, lines))
+        elif previous is None or len(previous) != len(lines):
+            out.write("\n".join(lines) + "\n")
+        else:
+            out.write("".join(new + "\n" for old, new in zip(previous, lines) if old != new))
+        out.flush()
+        previous = lines
+        n += 1
+        if count is not None and n >= count:
+            return
+        now = monotonic()
+        deadline = wsma_cryostat_compressor._next_deadline(deadline, interval, now)
+        sleep(deadline - now)
+
+
+def _compact(value):
+    """Round a value read from a 32 bit float register to the digits it holds."""
+    return float("{:.7g}".format(value)) if isinstance(value, float) else value
+
+
+def _write_records(comp, interval, count, fields, fmt, out):
+    """Write readings of the compressor as JSON lines or CSV rows."""
+    if fmt == 'csv':
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(('time',) + fields)
+    for record in comp.stream(interval, fields=fields, count=count):
+        values = [_compact(record[f]) for f in fields]
+        if fmt == 'json':
+            out.write(json.dumps(dict(zip(('time',) + fields, [record['time']] + values)), separators=(',', ':')) + "\n")
+        else:
+            writer.writerow([record['time']] + values)
+        out.flush()
+
+
 def main(args=None):
     args = parser.parse_args(args=args)
+    streaming = args.watch is not None or args.format != 'text'
+
+    fields = None
+    if args.fields:
+        fields = tuple(args.fields.split(","))
+        valid = [r.name for r in wsma_cryostat_compressor.Compressor._registers.select(kind='input')]
+        unknown = [f for f in fields if f not in valid]
+        if unknown:
+            parser.error("unknown field(s) {}; valid fields are: {}".format(", ".join(unknown), ", ".join(valid)))
 
     # Create the compressor object for communication with the controller
-    # If address is 0.0.0.0, create a dummy compressor for testing purposes.
-    if args.address == "0.0.0.0":
-        print(args)
-        return None
-        # comp = wsma_cryostat_compressor.DummyCompressor()
-    else:
-        comp = wsma_cryostat_compressor.Compressor(ip_address=args.address)
+    # If address is 0.0.0.0, communicate with a simulated compressor for testing purposes.
+    simulator = None
+    try:
+        if args.address == "0.0.0.0":
+            simulator = ModbusSimulator(SimulatedCompressor()).start()
+            comp = wsma_cryostat_compressor.Compressor(ip_address=simulator.host, port=simulator.port,
+                                                       instrument=args.stats, lazy=streaming)
+        else:
+            comp = wsma_cryostat_compressor.Compressor(ip_address=args.address, instrument=args.stats,
+                                                       lazy=streaming)
 
         if args.verbosity:
             comp.verbose = True
@@ -91,5 +192,24 @@ def main(args=None):
                 print()
                 print(comp.status)
 
-        else:
+        elif not streaming:
             print(comp)
+
+        if streaming:
+            # Keep the one connection open, and only read what is needed for each reading.
+            interval = args.watch if args.watch is not None else 0.0
+            count = args.count if args.watch is not None else 1
+            try:
+                if args.format == 'text':
+                    _watch_text(comp, interval, count, sys.stdout)
+                else:
+                    _write_records(comp, interval, count, fields or comp._monitor_names, args.format, sys.stdout)
+            except KeyboardInterrupt:
+                pass
+
+        if args.stats:
+            print()
+            print(format_stats(comp.stats()))
+    finally:
+        if simulator is not None:
+            simulator.stop()
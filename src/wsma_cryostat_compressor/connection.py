@@ -0,0 +1,209 @@
+"""
+Managed Modbus TCP connections.
+
+A ManagedClient wraps a pymodbus ModbusTcpClient, serializing requests from several threads
+or device objects, detecting broken connections and reconnecting with exponential backoff.
+A ConnectionPool shares one ManagedClient between all of the device objects that talk to the
+same gateway, such as several inverters behind one RS485 server.
+"""
+__version__ = '0.1.1'
+
+from threading import Lock, RLock
+from time import monotonic, sleep
+
+from pymodbus.client.sync import ModbusTcpClient
+from pymodbus.exceptions import ConnectionException, ModbusIOException
+
+#: float: delay in seconds before the first reconnection attempt
+default_backoff = 0.1
+
+#: float: maximum delay in seconds between reconnection attempts
+default_max_backoff = 5.0
+
+#: int: number of connection attempts made before a request fails
+default_connect_attempts = 3
+
+
+class ManagedClient(object):
+    """Thread safe Modbus TCP client that reconnects transparently.
+
+    Provides the read and write methods of ModbusTcpClient used by the Compressor and Inverter.
+    If the connection is broken, the socket is closed and reopened, waiting between
+    attempts with exponential backoff. Reads that fail because of a broken connection are
+    repeated once on the new connection, unless they are made with `resend=False` by a caller
+    that does its own retrying, such as a RetryPolicy. Writes are never repeated.
+    """
+    def __init__(self, client, backoff=default_backoff, max_backoff=default_max_backoff,
+                 connect_attempts=default_connect_attempts):
+        """Wrap a Modbus client.
+
+        Args:
+            client (ModbusTcpClient): the client to wrap.
+            backoff (float): delay in seconds before the first reconnection attempt.
+            max_backoff (float): maximum delay in seconds between reconnection attempts.
+            connect_attempts (int): number of connection attempts made before a request fails.
+        """
+        #: (:obj:`ModbusTcpClient`): the wrapped client
+        self.client = client
+
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.connect_attempts = connect_attempts
+
+        #: int: number of times the connection has been reopened after breaking
+        self.reconnects = 0
+
+        self._lock = RLock()
+        self._delay = 0.0
+        self._next_attempt = 0.0
+        self._broken = False
+
+    def __repr__(self):
+        return "ManagedClient({!r})".format(self.client)
+
+    def _connect(self):
+        """Open the connection if it is not open, retrying with backoff.
+
+        Raises:
+            ConnectionException: if the connection could not be opened."""
+        for _ in range(self.connect_attempts):
+            wait = self._next_attempt - monotonic()
+            if wait > 0:
+                sleep(wait)
+            if self.client.connect():
+                if self._broken:
+                    self.reconnects += 1
+                    self._broken = False
+                self._delay = 0.0
+                return
+            self._delay = min(max(2 * self._delay, self.backoff), self.max_backoff)
+            self._next_attempt = monotonic() + self._delay
+            self._broken = True
+        raise ConnectionException("Failed to connect[{}]".format(self.client))
+
+    def _drop(self):
+        """Close a connection that is believed to be broken."""
+        self.client.close()
+        self._broken = True
+
+    def _execute(self, method, retry, timeout, *args, **kwargs):
+        """Call a method of the wrapped client, reconnecting if needed.
+
+        Args:
+            method (str): name of the client method.
+            retry (bool): whether to repeat the request if it fails after being sent.
+            timeout (float): limit in seconds of the timeout of the connection and transaction,
+                or None to use the timeout of the client.
+
+        Returns:
+            the response from the client."""
+        with self._lock:
+            saved = getattr(self.client, 'timeout', None)
+            if timeout is not None:
+                self.client.timeout = timeout if saved is None else min(saved, timeout)
+            try:
+                for attempt in range(2):
+                    self._connect()
+                    try:
+                        r = getattr(self.client, method)(*args, **kwargs)
+                    except (ConnectionException, OSError):
+                        self._drop()
+                        if retry and attempt == 0:
+                            continue
+                        raise
+                    if isinstance(r, ModbusIOException):
+                        self._drop()
+                        if retry and attempt == 0:
+                            continue
+                    return r
+            finally:
+                if timeout is not None:
+                    self.client.timeout = saved
+
+    def connect(self):
+        """Open the connection.
+
+        Returns:
+            bool: True if the connection is open."""
+        with self._lock:
+            try:
+                self._connect()
+            except ConnectionException:
+                return False
+            return True
+
+    def close(self):
+        """Close the connection. It will be reopened by the next request."""
+        with self._lock:
+            self.client.close()
+
+    def read_input_registers(self, address, count=1, resend=True, timeout=None, **kwargs):
+        """Read input registers, see ModbusTcpClient.read_input_registers().
+
+        Args:
+            resend (bool): whether to repeat the request once if it fails.
+            timeout (float): limit in seconds of the timeout of this request, or None."""
+        return self._execute('read_input_registers', resend, timeout, address, count=count, **kwargs)
+
+    def read_holding_registers(self, address, count=1, resend=True, timeout=None, **kwargs):
+        """Read holding registers, see ModbusTcpClient.read_holding_registers().
+
+        Args:
+            resend (bool): whether to repeat the request once if it fails.
+            timeout (float): limit in seconds of the timeout of this request, or None."""
+        return self._execute('read_holding_registers', resend, timeout, address, count=count, **kwargs)
+
+    def write_register(self, address, value, **kwargs):
+        """Write a holding register, see ModbusTcpClient.write_register()."""
+        return self._execute('write_register', False, None, address, value, **kwargs)
+
+    def write_registers(self, address, values, **kwargs):
+        """Write holding registers, see ModbusTcpClient.write_registers()."""
+        return self._execute('write_registers', False, None, address, values, **kwargs)
+
+
+class ConnectionPool(object):
+    """Pool of ManagedClients, with one client for each Modbus TCP server."""
+    def __init__(self, client_class=ModbusTcpClient, **kwargs):
+        """Create a connection pool.
+
+        Args:
+            client_class (type): class of the Modbus clients to create.
+            kwargs: keyword arguments for each ManagedClient, e.g. backoff.
+        """
+        self._client_class = client_class
+        self._kwargs = kwargs
+        self._clients = {}
+        self._lock = Lock()
+
+    def get(self, host, port, timeout=None):
+        """Return the shared client for a Modbus TCP server, creating it if needed.
+
+        Args:
+            host (str): address of the server.
+            port (int): TCP port of the server.
+            timeout (float): timeout in seconds for each transaction, used if the client is created.
+
+        Returns:
+            ManagedClient: the client."""
+        key = (host, int(port))
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                kwargs = {} if timeout is None else {'timeout': timeout}
+                client = ManagedClient(self._client_class(host, port=int(port), **kwargs), **self._kwargs)
+                self._clients[key] = client
+            return client
+
+    def close(self):
+        """Close all of the connections in the pool."""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+
+    def __len__(self):
+        return len(self._clients)
+
+
+#: ConnectionPool: pool shared by all Compressor and Inverter objects created with `pool=True`
+default_pool = ConnectionPool()
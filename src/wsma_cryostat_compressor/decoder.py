@@ -0,0 +1,135 @@
+"""
+Decoding of blocks of Modbus registers into typed Python values.
+
+A BlockDecoder is built once from a table of fields, and compiles the table into a single
+struct format so that a whole block of registers is decoded with one call to struct.unpack.
+"""
+__version__ = '0.1.1'
+
+import struct
+
+#: dict: struct format character for each supported register value type
+_type_formats = {
+    'uint16': 'H',
+    'int16': 'h',
+    'uint32': 'I',
+    'int32': 'i',
+    'float32': 'f',
+}
+
+#: dict: number of 16 bit registers occupied by each supported register value type
+_type_widths = {
+    'uint16': 1,
+    'int16': 1,
+    'uint32': 2,
+    'int32': 2,
+    'float32': 2,
+}
+
+#: dict: struct byte order prefix for each word order
+_word_orders = {
+    'little': '<',
+    'big': '>',
+}
+
+
+def type_width(value_type):
+    """Return the number of registers occupied by a register value type.
+
+    Args:
+        value_type (str): one of 'uint16', 'int16', 'uint32', 'int32' or 'float32'.
+
+    Returns:
+        int: number of 16 bit registers."""
+    try:
+        return _type_widths[value_type]
+    except KeyError:
+        raise ValueError("Unknown register type {}".format(value_type))
+
+
+class BlockDecoder(object):
+    """Decoder for a contiguous block of Modbus registers.
+
+    Each register is big endian. 32 bit values span two registers, with the order of the
+    two words given by `wordorder`. Registers in the block that are not part of any field
+    are skipped.
+    """
+    def __init__(self, fields, start=0, count=None, wordorder='little'):
+        """Compile a table of fields into a decoder.
+
+        Args:
+            fields (iterable): (name, address, type) tuples describing each value in the block.
+            start (int): address of the first register in the block.
+            count (int): number of registers in the block. Defaults to the end of the last field.
+            wordorder (str): 'little' if the low word of 32 bit values comes first, 'big' otherwise.
+        """
+        try:
+            order = _word_orders[wordorder]
+        except KeyError:
+            raise ValueError("Unknown word order {}".format(wordorder))
+
+        fields = sorted(fields, key=lambda f: f[1])
+        fmt = []
+        offset = 0
+        for name, address, value_type in fields:
+            width = type_width(value_type)
+            if address < start + offset:
+                raise ValueError("Register field {} at {} overlaps the previous field".format(name, address))
+            gap = address - start - offset
+            if gap:
+                fmt.append('{}x'.format(2 * gap))
+            fmt.append(_type_formats[value_type])
+            offset += gap + width
+
+        if count is None:
+            count = offset
+        elif count < offset:
+            raise ValueError("Register fields extend beyond the end of the block")
+        elif count > offset:
+            fmt.append('{}x'.format(2 * (count - offset)))
+
+        #: tuple: names of the decoded fields, in the order returned by decode()
+        self.names = tuple(f[0] for f in fields)
+
+        #: int: address of the first register in the block
+        self.start = start
+
+        #: int: number of registers in the block
+        self.count = count
+
+        # The registers are packed in the chosen byte order, so that 32 bit values can be
+        # unpacked directly with the same byte order.
+        self._pack = struct.Struct('{}{}H'.format(order, count))
+        self._unpack = struct.Struct(order + ''.join(fmt))
+
+    def decode(self, registers):
+        """Decode a block of registers.
+
+        Args:
+            registers (list): the raw 16 bit register values of the block.
+
+        Returns:
+            tuple: the decoded values, in the order of self.names."""
+        return self._unpack.unpack(self._pack.pack(*registers))
+
+    def encode(self, values):
+        """Encode values into a block of registers, the inverse of decode().
+
+        Registers in the block that are not part of any field are set to zero.
+
+        Args:
+            values (sequence): the value of each field, in the order of self.names.
+
+        Returns:
+            tuple: the raw 16 bit register values of the block."""
+        return self._pack.unpack(self._unpack.pack(*values))
+
+    def decode_dict(self, registers):
+        """Decode a block of registers into a dictionary.
+
+        Args:
+            registers (list): the raw 16 bit register values of the block.
+
+        Returns:
+            dict: the decoded values keyed by field name."""
+        return dict(zip(self.names, self.decode(registers)))
@@ -0,0 +1,272 @@
+"""
+Export of device readings to columnar files.
+
+A ColumnarWriter buffers readings column by column in typed arrays, and writes them out as one
+row group each time `row_group_size` readings have been buffered, so that a live stream or a
+long TelemetryLog can be exported without holding it all in memory. Each column has the type
+of the register it was read from: 32 bit floats for temperatures and pressures, integers for
+state codes, and 32 bit integers for the warning and error flag bitsets, decoded from the
+negative codes reported by the compressor as CompressorFlag bits.
+
+ParquetWriter requires pyarrow, and HDF5Writer requires h5py::
+
+    with open_writer('compressor.parquet', Compressor._monitor_names) as writer:
+        writer.write_stream(comp.stream(interval=1.0, fields=writer.fields))
+
+    export_log(TelemetryLog('compressor.log'), 'compressor.h5')
+"""
+__version__ = '0.1.1'
+
+import os
+from array import array
+
+from wsma_cryostat_compressor import _flag_bits
+from wsma_cryostat_compressor.registers import compressor_registers
+
+#: int: default number of readings in each row group
+default_row_group_size = 65536
+
+#: frozenset: names of the registers holding flag bitsets, stored as floats by the compressor
+_flag_fields = frozenset(('warning_code', 'error_code'))
+
+#: dict: array typecode of each column type
+_typecodes = {
+    'float64': 'd',
+    'float32': 'f',
+    'int32': 'i',
+    'uint16': 'H',
+    'int16': 'h',
+}
+
+
+def column_types(fields, registers=compressor_registers):
+    """Return the column type of each field.
+
+    Args:
+        fields (iterable): names of the fields.
+        registers (RegisterMap): the registers the fields are read from.
+            Fields not in the map are stored as 64 bit floats.
+
+    Returns:
+        list: 'float64', 'float32', 'int32', 'uint16' or 'int16' for each field."""
+    types = []
+    for field in fields:
+        if field in _flag_fields:
+            types.append('int32')
+        elif field not in registers:
+            types.append('float64')
+        else:
+            register = registers[field]
+            if register.scale is not None or register.type in ('float32', 'uint32'):
+                types.append('float32')
+            else:
+                types.append(register.type)
+    return types
+
+
+class ColumnarWriter(object):
+    """Base class of writers of readings to columnar files, in row groups.
+
+    Subclasses implement _write_batch() and _close().
+    """
+    def __init__(self, path, fields, registers=compressor_registers, row_group_size=default_row_group_size):
+        """Create the writer.
+
+        Args:
+            path (str): path of the file to write.
+            fields (iterable): names of the fields in each reading.
+            registers (RegisterMap): the registers the fields are read from, giving the column types.
+            row_group_size (int): number of readings in each row group.
+        """
+        #: tuple: names of the fields in each reading
+        self.fields = tuple(fields)
+
+        #: list: column type of each field
+        self.types = column_types(self.fields, registers)
+
+        self.path = path
+        self.row_group_size = row_group_size
+
+        #: int: number of readings written
+        self.rows = 0
+
+        self._converters = [_flag_bits if f in _flag_fields else int if _typecodes[t] in 'iHh' else float
+                            for f, t in zip(self.fields, self.types)]
+        self._new_batch()
+
+    def _new_batch(self):
+        self._times = array('d')
+        self._columns = [array(_typecodes[t]) for t in self.types]
+
+    def append(self, t, values):
+        """Add a reading.
+
+        Args:
+            t (float): Unix time of the reading.
+            values (sequence): the value of each field, in the order of self.fields.
+        """
+        self._times.append(t)
+        for column, convert, value in zip(self._columns, self._converters, values):
+            column.append(convert(value))
+        if len(self._times) >= self.row_group_size:
+            self.flush()
+
+    def write_stream(self, records):
+        """Add readings from an iterable of dicts, such as Compressor.stream().
+
+        Args:
+            records (iterable): dicts with the time of the reading under 'time' and a value for each field.
+        """
+        for record in records:
+            self.append(record['time'], [record[f] for f in self.fields])
+
+    def write_records(self, records):
+        """Add readings from an iterable of tuples, such as TelemetryLog.records().
+
+        Args:
+            records (iterable): tuples of the time of the reading followed by the value of each field.
+        """
+        for record in records:
+            self.append(record[0], record[1:])
+
+    def flush(self):
+        """Write the buffered readings as a row group."""
+        if self._times:
+            self._write_batch(self._times, self._columns)
+            self.rows += len(self._times)
+            self._new_batch()
+
+    def close(self):
+        """Write the buffered readings and close the file."""
+        self.flush()
+        self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _write_batch(self, times, columns):
+        """Write one row group. Implemented by subclasses.
+
+        Args:
+            times (array): Unix times of the readings.
+            columns (list): an array of the values of each field.
+        """
+        raise NotImplementedError
+
+    def _close(self):
+        """Close the file. Implemented by subclasses."""
+
+
+class ParquetWriter(ColumnarWriter):
+    """Writer of readings to a Parquet file. Requires pyarrow."""
+    def __init__(self, path, fields, registers=compressor_registers, row_group_size=default_row_group_size,
+                 compression='snappy'):
+        """Create the file.
+
+        Args:
+            path (str): path of the file to write.
+            fields (iterable): names of the fields in each reading.
+            registers (RegisterMap): the registers the fields are read from, giving the column types.
+            row_group_size (int): number of readings in each row group.
+            compression (str): Parquet compression codec.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        ColumnarWriter.__init__(self, path, fields, registers, row_group_size)
+        self._pa = pa
+        self._arrow_types = [pa.float64()] + [getattr(pa, t)() for t in self.types]
+        self._schema = pa.schema([('time', pa.float64())] + list(zip(self.fields, self._arrow_types[1:])))
+        self._writer = pq.ParquetWriter(path, self._schema, compression=compression)
+
+    def _write_batch(self, times, columns):
+        pa = self._pa
+        arrays = [pa.Array.from_buffers(arrow_type, len(times), [None, pa.py_buffer(column)])
+                  for arrow_type, column in zip(self._arrow_types, [times] + columns)]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema), row_group_size=len(times))
+
+    def _close(self):
+        self._writer.close()
+
+
+class HDF5Writer(ColumnarWriter):
+    """Writer of readings to an HDF5 file, with one chunked dataset per field. Requires h5py."""
+    def __init__(self, path, fields, registers=compressor_registers, row_group_size=default_row_group_size,
+                 group='/', compression='gzip'):
+        """Create the file, or add to it if it exists.
+
+        Args:
+            path (str): path of the file to write.
+            fields (iterable): names of the fields in each reading.
+            registers (RegisterMap): the registers the fields are read from, giving the column types.
+            row_group_size (int): number of readings in each row group, and in each HDF5 chunk.
+            group (str): HDF5 group to create the datasets in.
+            compression (str): HDF5 compression filter.
+        """
+        import h5py
+
+        ColumnarWriter.__init__(self, path, fields, registers, row_group_size)
+        self._file = h5py.File(path, 'a')
+        group = self._file.require_group(group)
+        self._datasets = [group.require_dataset(name, shape=(0,), maxshape=(None,), dtype=dtype,
+                                                chunks=(row_group_size,), compression=compression)
+                          for name, dtype in zip(('time',) + self.fields, ['float64'] + self.types)]
+
+    def _write_batch(self, times, columns):
+        import numpy as np
+
+        for dataset, column in zip(self._datasets, [times] + columns):
+            n = dataset.shape[0]
+            dataset.resize((n + len(column),))
+            dataset[n:] = np.frombuffer(column, dtype=dataset.dtype)
+
+    def _close(self):
+        self._file.close()
+
+
+#: dict: writer class for each file extension
+_writers = {
+    '.parquet': ParquetWriter,
+    '.pq': ParquetWriter,
+    '.h5': HDF5Writer,
+    '.hdf5': HDF5Writer,
+}
+
+
+def open_writer(path, fields, registers=compressor_registers, row_group_size=default_row_group_size):
+    """Create a writer for the format given by the extension of a file.
+
+    Args:
+        path (str): path of the file to write, ending in .parquet, .pq, .h5 or .hdf5.
+        fields (iterable): names of the fields in each reading.
+        registers (RegisterMap): the registers the fields are read from, giving the column types.
+        row_group_size (int): number of readings in each row group.
+
+    Returns:
+        ColumnarWriter: the writer."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in _writers:
+        raise ValueError("Unknown columnar file extension {!r}".format(extension))
+    return _writers[extension](path, fields, registers=registers, row_group_size=row_group_size)
+
+
+def export_log(log, path, registers=compressor_registers, start=None, end=None,
+               row_group_size=default_row_group_size):
+    """Export a time range of a TelemetryLog to a columnar file.
+
+    Args:
+        log (TelemetryLog): the log to export.
+        path (str): path of the file to write, ending in .parquet, .pq, .h5 or .hdf5.
+        registers (RegisterMap): the registers the fields of the log were read from.
+        start (float): Unix time of the earliest reading, or None to start at the first reading.
+        end (float): Unix time after the latest reading, or None to end at the last reading.
+        row_group_size (int): number of readings in each row group.
+
+    Returns:
+        int: the number of readings exported."""
+    with open_writer(path, log.fields, registers=registers, row_group_size=row_group_size) as writer:
+        writer.write_records(log.records(start, end))
+    return writer.rows
@@ -0,0 +1,172 @@
+"""
+Parallel polling of many compressors.
+
+A CompressorFleet polls a list of Compressor Digital Panels concurrently from a pool of worker
+threads, and returns one consolidated snapshot table. Each device has its own timeout, so a
+panel that is dead or slow to respond cannot stall the poll of the others.
+"""
+__version__ = '0.1.1'
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Lock
+from time import monotonic, time
+
+import wsma_cryostat_compressor
+
+
+class CompressorFleet(object):
+    """Poll a group of compressors in parallel."""
+    def __init__(self, addresses, port=wsma_cryostat_compressor.default_port, timeout=wsma_cryostat_compressor.default_timeout,
+                 fields=None, max_workers=None):
+        """Create a fleet. No communication takes place until the first poll.
+
+        Args:
+            addresses (iterable): IP addresses of the compressors, or (address, port) tuples.
+            port (int): TCP port used for addresses given without a port.
+            timeout (float): time in seconds to wait for each compressor to respond to a poll.
+            fields (iterable): names of the values to read from each compressor, see Compressor.read().
+                Defaults to all of the values read by Compressor.update().
+            max_workers (int): number of worker threads. Defaults to one per compressor.
+        """
+        #: list: (address, port) of each compressor
+        self._addresses = []
+        for address in addresses:
+            if isinstance(address, str):
+                address = (address, port)
+            self._addresses.append(tuple(address))
+
+        #: float: time in seconds to wait for each compressor
+        self.timeout = timeout
+
+        #: tuple: names of the values read from each compressor
+        self.fields = tuple(fields) if fields is not None else wsma_cryostat_compressor.Compressor._monitor_names
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or max(len(self._addresses), 1))
+
+        #: dict: Compressor objects, keyed by (address, port), created on the first successful poll.
+        self._compressors = {}
+
+        # Polls that have not finished yet, keyed by (address, port)
+        self._pending = {}
+        self._lock = Lock()
+
+    @property
+    def addresses(self):
+        """list: (address, port) of each compressor in the fleet."""
+        return list(self._addresses)
+
+    @property
+    def compressors(self):
+        """dict: the connected Compressor objects, keyed by (address, port)."""
+        with self._lock:
+            return dict(self._compressors)
+
+    def _poll_one(self, key):
+        """Read the values from one compressor, connecting to it if needed.
+
+        Args:
+            key (tuple): (address, port) of the compressor.
+
+        Returns:
+            tuple: (the values read, the time taken in seconds)."""
+        start = monotonic()
+        with self._lock:
+            comp = self._compressors.get(key)
+        if comp is None:
+            comp = wsma_cryostat_compressor.Compressor(ip_address=key[0], port=key[1], timeout=self.timeout, lazy=True)
+            with self._lock:
+                self._compressors[key] = comp
+        values = comp.read(self.fields)
+        return values, monotonic() - start
+
+    def _row(self, key, values=None, error=None, elapsed=None):
+        """Build one row of the snapshot table."""
+        row = OrderedDict((('address', key[0]), ('port', key[1]), ('ok', error is None),
+                           ('error', error), ('elapsed', elapsed)))
+        for name in self.fields:
+            row[name] = values.get(name) if values else None
+        return row
+
+    def poll(self):
+        """Poll every compressor in the fleet concurrently.
+
+        A compressor that is still busy with a poll that previously timed out is not polled again
+        until that poll has finished.
+
+        Returns:
+            list: one OrderedDict per compressor, in the order of self.addresses, with the
+            address, port, whether the poll succeeded, the error message if it failed, the time
+            taken to poll that compressor in seconds and the values of self.fields."""
+        futures = {}
+        busy = set()
+        for key in self._addresses:
+            pending = self._pending.get(key)
+            if pending is not None and not pending.done():
+                busy.add(key)
+                continue
+            futures[key] = self._executor.submit(self._poll_one, key)
+            self._pending[key] = futures[key]
+
+        wait(list(futures.values()), timeout=self.timeout)
+
+        rows = []
+        for key in self._addresses:
+            if key in busy:
+                rows.append(self._row(key, error="Busy with a previous poll"))
+                continue
+            future = futures[key]
+            if not future.done():
+                rows.append(self._row(key, error="Timed out after {} s".format(self.timeout)))
+            elif future.exception() is not None:
+                rows.append(self._row(key, error=str(future.exception()) or type(future.exception()).__name__))
+            else:
+                values, elapsed = future.result()
+                rows.append(self._row(key, values=values, elapsed=elapsed))
+        return rows
+
+    def snapshot(self):
+        """Poll every compressor and return the results with a timestamp.
+
+        Returns:
+            tuple: (time, rows), where time is the Unix time of the start of the poll and
+            rows is as returned by poll()."""
+        t = time()
+        return t, self.poll()
+
+    def close(self):
+        """Close the connections to all of the compressors and stop the worker threads."""
+        self._executor.shutdown(wait=False)
+        with self._lock:
+            for comp in self._compressors.values():
+                comp._client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def format_table(rows, fields=None):
+    """Format the rows returned by CompressorFleet.poll() as a plain text table.
+
+    Args:
+        rows (list): the rows of the table.
+        fields (iterable): the columns to include. Defaults to all of the columns of the first row.
+
+    Returns:
+        str: the table."""
+    if not rows:
+        return ""
+    if fields is None:
+        fields = [f for f in rows[0] if f not in ('port', 'ok', 'elapsed')]
+
+    def cell(value):
+        if isinstance(value, float):
+            return "{:.2f}".format(value)
+        return "" if value is None else str(value)
+
+    table = [list(fields)] + [[cell(row.get(f)) for f in fields] for row in rows]
+    widths = [max(len(r[i]) for r in table) for i in range(len(fields))]
+    return "\n".join("  ".join(c.ljust(w) for c, w in zip(r, widths)).rstrip() for r in table)
@@ -0,0 +1,175 @@
+"""
+Fixed size in-memory history of device readings.
+
+A History is a ring buffer holding the most recent readings of a set of fields. Each field,
+and the time of each reading, is stored in its own preallocated array of doubles, so the
+memory used is fixed however long the device is polled for.
+"""
+__version__ = '0.1.1'
+
+from array import array
+from math import sqrt
+
+
+class History(object):
+    """Ring buffer of timestamped readings, stored column by column."""
+    def __init__(self, fields, capacity):
+        """Create an empty history.
+
+        Args:
+            fields (iterable): names of the fields recorded in each reading.
+            capacity (int): maximum number of readings kept. Older readings are overwritten.
+        """
+        if capacity < 1:
+            raise ValueError("History capacity must be at least 1")
+
+        #: tuple: names of the fields recorded
+        self.fields = tuple(fields)
+
+        #: int: maximum number of readings kept
+        self.capacity = capacity
+
+        self._times = array('d', bytes(8 * capacity))
+        self._columns = dict((f, array('d', bytes(8 * capacity))) for f in self.fields)
+        self._column_list = [self._columns[f] for f in self.fields]
+        self._next = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __repr__(self):
+        return "History({!r}, {}) with {} readings".format(self.fields, self.capacity, self._len)
+
+    def append(self, t, values):
+        """Add a reading, overwriting the oldest reading if the history is full.
+
+        Args:
+            t (float): Unix time of the reading.
+            values (sequence): the value of each field, in the order of self.fields.
+        """
+        i = self._next
+        self._times[i] = t
+        for column, value in zip(self._column_list, values):
+            column[i] = value
+        self._next = (i + 1) % self.capacity
+        if self._len < self.capacity:
+            self._len += 1
+
+    def clear(self):
+        """Discard all of the readings."""
+        self._next = 0
+        self._len = 0
+
+    def _ordered(self, column, n=None):
+        """Return the last `n` entries of a column in chronological order."""
+        if n is None or n > self._len:
+            n = self._len
+        end = self._next
+        start = end - n
+        if start >= 0:
+            return column[start:end]
+        return column[start + self.capacity:] + column[:end]
+
+    def _window_count(self, window):
+        """Return the number of readings made within `window` seconds of the latest reading."""
+        if window is None or self._len == 0:
+            return self._len
+        latest = self._times[self._next - 1]
+        n = 0
+        i = self._next - 1
+        while n < self._len and latest - self._times[i] <= window:
+            n += 1
+            i -= 1
+        return n
+
+    def times(self, window=None):
+        """Return the times of the readings.
+
+        Args:
+            window (float): only return readings made within this many seconds of the latest reading.
+
+        Returns:
+            array: Unix times of the readings, oldest first."""
+        return self._ordered(self._times, self._window_count(window))
+
+    def column(self, field, window=None):
+        """Return the recorded values of one field.
+
+        Args:
+            field (str): name of the field.
+            window (float): only return readings made within this many seconds of the latest reading.
+
+        Returns:
+            array: the values, oldest first."""
+        return self._ordered(self._columns[field], self._window_count(window))
+
+    def latest(self):
+        """Return the most recent reading.
+
+        Returns:
+            dict: the time of the reading under 'time' and the value of each field, or None if empty."""
+        if self._len == 0:
+            return None
+        i = self._next - 1
+        reading = {'time': self._times[i]}
+        for f in self.fields:
+            reading[f] = self._columns[f][i]
+        return reading
+
+    def statistics(self, field, window=None):
+        """Return summary statistics of one field.
+
+        Args:
+            field (str): name of the field.
+            window (float): only use readings made within this many seconds of the latest reading.
+
+        Returns:
+            dict: the number of readings 'n', and the 'mean', 'min', 'max' and standard deviation 'std'."""
+        values = self.column(field, window)
+        n = len(values)
+        if n == 0:
+            return {'n': 0, 'mean': None, 'min': None, 'max': None, 'std': None}
+        mean = sum(values) / n
+        var = sum((v - mean) ** 2 for v in values) / n
+        return {'n': n, 'mean': mean, 'min': min(values), 'max': max(values), 'std': sqrt(var)}
+
+    def trend(self, field, window=None):
+        """Return the least squares rate of change of one field.
+
+        Args:
+            field (str): name of the field.
+            window (float): only use readings made within this many seconds of the latest reading.
+
+        Returns:
+            float: rate of change in units per second, or None if there are fewer than two readings."""
+        n = self._window_count(window)
+        if n < 2:
+            return None
+        times = self._ordered(self._times, n)
+        values = self._ordered(self._columns[field], n)
+        t0 = times[0]
+        t_mean = sum(t - t0 for t in times) / n
+        v_mean = sum(values) / n
+        num = sum((t - t0 - t_mean) * (v - v_mean) for t, v in zip(times, values))
+        den = sum((t - t0 - t_mean) ** 2 for t in times)
+        if den == 0:
+            return None
+        return num / den
+
+    def as_numpy(self, window=None):
+        """Return the readings as a NumPy structured array. Requires NumPy.
+
+        Args:
+            window (float): only return readings made within this many seconds of the latest reading.
+
+        Returns:
+            numpy.ndarray: structured array with a 'time' field and one field per recorded field."""
+        import numpy as np
+
+        n = self._window_count(window)
+        result = np.empty(n, dtype=[('time', 'f8')] + [(f, 'f8') for f in self.fields])
+        result['time'] = self._ordered(self._times, n)
+        for f in self.fields:
+            result[f] = self._ordered(self._columns[f], n)
+        return result
@@ -1,17 +1,23 @@
 __version__ = '0.1.1'
 
-from time import sleep
+from time import sleep, time
 
 from pymodbus.client.sync import ModbusTcpClient
-from pymodbus.payload import BinaryPayloadDecoder, BinaryPayloadBuilder
-from pymodbus.constants import Endian
 from pymodbus.exceptions import ModbusIOException
 
-from retrying import retry
+from wsma_cryostat_compressor.connection import ManagedClient, default_pool
+from wsma_cryostat_compressor.history import History
+from wsma_cryostat_compressor.registers import inverter_registers, register_accessors
+from wsma_cryostat_compressor.retry import RetryPolicy
+from wsma_cryostat_compressor.stats import RequestStats, timed_request
 
 default_address = "inverter-p1"
 default_port = 502
 
+#: int: default maximum number of unwanted registers read to join two values, so that the
+#: monitored values from 0x1001 to 0x1011 are read in one request
+default_read_gap = 16
+
 def _is_modbus_io_error(exception):
     """Return True if an exception is an ModbusIOError, False otherwise.
     
@@ -22,6 +28,22 @@ def _is_modbus_io_error(exception):
         boolean : is exception an IOError?"""
     return isinstance(exception, ModbusIOException)
 
+
+def _frequency_code(freq):
+    """Convert a frequency in Hz to the inverter's frequency setting, checking that it is in range.
+
+    arguments:
+        freq : float: Inverter frequency in Hz.
+
+    returns:
+        int : Frequency in units of 0.01 Hz."""
+    f = int(freq * 100)
+    if f > 7000 or f < 4000:
+        raise ValueError("Cannot set inverter frequency outside the range of 40-70 Hz")
+    return f
+
+
+@register_accessors(inverter_registers)
 class Inverter(object):
     """Class for communicating with the wSMA Compressor controller.
 
@@ -29,34 +51,37 @@ class Inverter(object):
     communicates with the TCP/IP Modbus client on the RS485 server attached
     to the inverter
     """
-    #: int: address of the inverter's frequency holding register.
-    _frequency_addr = 0x1001
-
-    #: int: address of the inverter's frequency setting holding register.
-    _frequency_control_addr = 0x0001
-
-    #: int: address of the inverter's output current monitor input register
-    _current_addr = 0x1002
-
-    #: int: address of the inverter's output voltage monitor input register
-    _voltage_addr = 0x1010
-
-    #: int: address of the inverter's output power monitor inpur register
-    _power_addr = 0x1011
+    #: RegisterMap: the registers of the inverter
+    _registers = inverter_registers
 
     #: int: unit address
     _unit_addr = 0x01
 
-    def __init__(self, address=default_address, port=default_port, unit=1):
+    #: tuple: names of the values read by update()
+    _monitor_names = ('frequency', 'current', 'voltage', 'power')
+
+    def __init__(self, address=default_address, port=default_port, unit=1, pool=None, history=None, retry=None,
+                 instrument=False):
         """Create an inverter object for communication with the inverter.
 
         Args:
             address (str): the TCPIP address of the Modbus TCP server.
             port (int): the port of the Modbus TCP server.
             unit (int): the Modbus unit of the inverter.
+            pool (ConnectionPool): pool of connections to share the connection to the Modbus TCP server with other
+                objects. If True, the default pool is used. If None, the Inverter has its own connection.
+            history (int): if given, keep this many of the most recent readings made by update() in self.history.
+            retry (RetryPolicy): policy for retrying reads that get no response. Defaults to up to 5 attempts
+                within 3 seconds.
+            instrument (bool): if True, record statistics of every request, returned by self.stats().
         """
         # set up the communications
-        self._client = ModbusTcpClient(address, port=port)
+        if pool is None:
+            self._client = ManagedClient(ModbusTcpClient(address, port=port))
+        else:
+            if pool is True:
+                pool = default_pool
+            self._client = pool.get(address, port)
         self._client.connect()
 
         #: str: IP address and port for the inverter.
@@ -81,30 +106,21 @@ class Inverter(object):
 
         self.verbose = False
 
-        # Get the data from the inverter
-        self.update()
-
-    @property
-    def frequency(self):
-        """float: The frequency of the inverter in Hz.
+        #: RetryPolicy: retries and circuit breaker for reads from the inverter
+        self.retry = retry if retry is not None else RetryPolicy(attempts=5, backoff=0.1, deadline=3.0)
 
-        Read only - set the frequency via the set_frequency method."""
-        return self._frequency * 0.01
+        #: RequestStats: statistics of the requests made, or None if they are not recorded
+        self.request_stats = RequestStats(self._registers) if instrument else None
 
-    @property
-    def current(self):
-        """float: The output current of the inverter in Amps."""
-        return self._current * 0.1
+        #: int: maximum number of unwanted registers read to join two values into one request.
+        #: Set to 0 to read only the registers holding values.
+        self.read_gap = default_read_gap
 
-    @property
-    def voltage(self):
-        """float: The output voltage of the inverter in Volts."""
-        return self._voltage * 0.1
+        #: History: recent readings made by self.update(), or None if no history is kept.
+        self.history = History(self._monitor_names, history) if history else None
 
-    @property
-    def power(self):
-        """float: The output power of the inverter in kW."""
-        return self._power * 0.1
+        # Get the data from the inverter
+        self.update()
 
     @property
     def address(self):
@@ -113,10 +129,9 @@ class Inverter(object):
 
     def update(self):
         """Get updated values for all monitor values from the inverter"""
-        self._get_frequency()
-        self._get_current()
-        self._get_voltage()
-        self._get_power()
+        self._read_values(self._monitor_names, self.read_gap)
+        if self.history is not None:
+            self.history.append(time(), [getattr(self, name) for name in self._monitor_names])
 
     def __repr__(self):
         """Brief description of the object."""
@@ -132,16 +147,84 @@ class Inverter(object):
                               "Frequency  : {} Hz".format(self.frequency)))
     
     
-    @retry(retry_on_exception=_is_modbus_io_error, wait_random_min=300, wait_random_max=900, stop_max_attempt_number=5)
     def _read_registers(self, address, count=1, unit=1):
-        """Read holding registers and check for errors, using the
-        retrying module to retry up to 5 times."""
-        r = self._client.read_holding_registers(address, count=count, unit=unit)
+        """Read holding registers and check for errors, retrying
+        according to self.retry."""
+        r = self.retry.call(self._read_holding_registers, address, count, unit)
+        if r.isError():
+            raise RuntimeError("Could not read inverter registers {} to {}: {}".format(address, address + count - 1, r))
+        return r
+
+    def _read_holding_registers(self, address, count, unit):
+        """Read holding registers, raising ModbusIOException if the inverter does not respond.
+
+        The request is sent once, with a timeout limited to the time left before the deadline of
+        self.retry, which decides whether it is repeated."""
+        r = timed_request(self.request_stats, self._client, 'read_holding_registers', address, count, count=count,
+                          unit=unit, resend=False, timeout=self.retry.remaining())
         if _is_modbus_io_error(r):
             raise r
         else:
             return r
 
+    def _read_values(self, names, max_gap):
+        """Read the named values with the fewest requests, and store them.
+
+        Args:
+            names (iterable): names of the registers to read.
+            max_gap (int): maximum number of unwanted registers read to join two values into one request.
+
+        Returns:
+            list: the Registers read."""
+        read = []
+        for span, decoder in self._registers.plan(names, max_gap=max_gap):
+            r = self._read_registers(span.start, count=span.count, unit=1)
+            for name, value in zip(decoder.names, decoder.decode(r.registers)):
+                register = self._registers[name]
+                setattr(self, register.attr, value)
+                read.append(register)
+        return read
+
+    def read(self, fields=None, max_gap=None):
+        """Read a group of values from the inverter using as few requests as possible.
+
+        The values read are also stored, so the corresponding properties are updated.
+
+        Args:
+            fields (iterable): names of the values to read, e.g. ['frequency', 'current'].
+                Defaults to all of the values read by update().
+            max_gap (int): maximum number of unwanted registers read to join two values. Defaults to self.read_gap.
+
+        Returns:
+            dict: the values read in physical units, keyed by name."""
+        if fields is None:
+            fields = self._monitor_names
+        if max_gap is None:
+            max_gap = self.read_gap
+        return dict((r.name, r.value(getattr(self, r.attr))) for r in self._read_values(fields, max_gap))
+
+    def stats(self):
+        """Return statistics of the requests made to the inverter.
+
+        Returns:
+            dict: the RequestStats summary of each block of registers under 'requests', empty unless the
+            Inverter was created with instrument=True, the RetryPolicy counters under 'retry', and
+            the number of times the connection has been reopened under 'reconnects'."""
+        return {'requests': self.request_stats.summary() if self.request_stats is not None else [],
+                'retry': self.retry.counters(),
+                'reconnects': getattr(self._client, 'reconnects', 0)}
+
+    def _read_register(self, register):
+        """Read the value of one register from the inverter.
+
+        Args:
+            register (Register): description of the register to read.
+
+        Returns:
+            the raw value of the register."""
+        r = self._read_registers(register.address, count=register.width, unit=1)
+        return self._registers.decoder((register.name,)).decode(r.registers)[0]
+
     @property
     def status(self):
         """str: Detailed status of the inverter"""
@@ -163,36 +246,28 @@ class Inverter(object):
 
     def _get_frequency(self):
         """Get the current frequency from the inverter"""
-        r = self._read_registers(self._frequency_addr, count=2, unit=1)
-        decoder = BinaryPayloadDecoder.fromRegisters(r.registers, byteorder=Endian.Big, wordorder=Endian.Big)
-        result = decoder.decode_16bit_int()
-        self._frequency = result
-
-    def _get_current(self):
-        """Get the output current from the inverter"""
-        r = self._read_registers(self._current_addr, count=1, unit=1)
-        self._current = r.registers[0]
-
-    def _get_voltage(self):
-        """Get the output voltage from the inverter"""
-        r = self._read_registers(self._voltage_addr, count=1, unit=1)
-        self._voltage = r.registers[0]
-
-    def _get_power(self):
-        """Get the output power from the inverter"""
-        r = self._read_registers(self._power_addr, count=1, unit=1)
-        self._power = r.registers[0]
+        register = self._registers['frequency']
+        r = self._read_registers(register.address, count=2, unit=1)
+        self._frequency = self._registers.decoder(('frequency',), count=2).decode(r.registers)[0]
 
     def _set_frequency(self, freq):
         """Set the output frequency of the inverter.
 
         Args:
             freq: int: Frequency to set in units of 0.01 Hz"""
-        # munge frequency into two bytes
-        response = self._client.write_register(self._frequency_control_addr, freq, count=1, unit=1)
+        self._write_frequency(freq)
         sleep(self._set_delay)
         self._get_frequency()
 
+    def _write_frequency(self, freq):
+        """Write the frequency setting register of the inverter.
+
+        Args:
+            freq: int: Frequency to set in units of 0.01 Hz"""
+        # munge frequency into two bytes
+        response = timed_request(self.request_stats, self._client, 'write_register',
+                                 self._registers['frequency_control'].address, 1, freq, count=1, unit=1)
+
     def get_frequency(self):
         """Get current frequency from the inverter and return the value.
 
@@ -206,34 +281,6 @@ class Inverter(object):
 
         Args:
             freq: float: Inverter frequency in Hz."""
-        f = int(freq * 100)
-        if f > 7000 or f < 4000:
-            raise ValueError("Cannot set inverter frequency outside the range of 40-70 Hz")
-        else:
-            self._set_frequency(f)
+        self._set_frequency(_frequency_code(freq))
 
         return self.frequency
-
-    def get_current(self):
-        """Get the output current from the inverter and return the value.
-
-        Returns:
-            float: Current in Amps."""
-        self._get_current()
-        return self.current
-
-    def get_voltage(self):
-        """Get the output voltage from the inverter and return the value.
-
-        Returns:
-            float: Voltage in Volts."""
-        self._get_voltage()
-        return self.voltage
-
-    def get_power(self):
-        """Get the output power from the inverter and return the value.
-
-        Returns:
-            float: Power in kW."""
-        self._get_power()
-        return self.power
@@ -18,6 +18,8 @@ __version__ = '0.1.1'
 
 import argparse
 import wsma_cryostat_compressor.inverter
+from wsma_cryostat_compressor.simulator import ModbusSimulator, SimulatedInverter
+from wsma_cryostat_compressor.stats import format_stats
 
 default_address = 'inverter-p1'
 default_port = 502
@@ -32,20 +34,23 @@ parser.add_argument("-a", "--address", default=default_address,
 parser.add_argument("-p", "--port", default=default_port,
                     help="The TCPIP port of the inverter's modbus server")
 parser.add_argument("-f", "--freq", help="Frequency to set the inverter to", type=float)
+parser.add_argument("--stats", action="store_true",
+                    help="Print statistics of the requests made to the inverter")
 
 
 def main(args=None):
     args = parser.parse_args(args=args)
 
     # Create the Inverter object for communication with the inverter.
-    # If port is "Test", create a dummy invert for testing purposes.
+    # If port is "Test", communicate with a simulated inverter for testing purposes.
+    simulator = None
     if args.port == "Test":
-        print(args)
-        return None
-        # inv = wsma_cryostat_compressor.inverter.Dummy_Inverter()
+        simulator = ModbusSimulator(SimulatedInverter()).start()
+        inv = wsma_cryostat_compressor.inverter.Inverter(address=simulator.host, port=simulator.port, instrument=args.stats)
     else:
-        inv = wsma_cryostat_compressor.inverter.Inverter(port=args.port)
+        inv = wsma_cryostat_compressor.inverter.Inverter(port=args.port, instrument=args.stats)
 
+    try:
         if args.verbosity:
             inv.verbose = True
 
@@ -59,3 +64,10 @@ def main(args=None):
 
         else:
             print(inv)
+
+        if args.stats:
+            print()
+            print(format_stats(inv.stats()))
+    finally:
+        if simulator is not None:
+            simulator.stop()
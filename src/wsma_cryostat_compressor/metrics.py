@@ -0,0 +1,215 @@
+"""
+Prometheus metrics endpoint for compressors and inverters.
+
+A MetricsExporter polls a group of Compressor and Inverter objects from a background thread,
+renders their values in the Prometheus text exposition format, and serves the latest rendering
+over HTTP at /metrics. Scrapes never cause Modbus requests, so any number of scrapers can be
+served cheaply. Each value read by update() is a gauge labelled with the name of the device,
+and each warning and error flag of a compressor is a gauge labelled with the flag name::
+
+    with MetricsExporter({'p1': Compressor(), 'p1-inverter': Inverter()}, ('0.0.0.0', 9500)):
+        ...
+"""
+__version__ = '0.1.1'
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from time import monotonic, time
+
+import wsma_cryostat_compressor
+
+#: str: prefix of the names of all of the metrics
+metric_prefix = 'cryomech_'
+
+#: str: content type of the Prometheus text exposition format
+content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    """Escape a label value."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    return ",".join('{}="{}"'.format(k, _escape(v)) for k, v in labels.items())
+
+
+def _help(register, device):
+    """Return the help text of the metric for a register."""
+    text = register.doc.split("\n")[0].split(": ", 1)[-1] if register.doc else register.name
+    unit = register.unit_for(device)
+    return "{} Unit: {}.".format(text, unit) if unit else text
+
+
+class _Families(object):
+    """Metric families being rendered, with their samples in order."""
+    def __init__(self):
+        self._families = OrderedDict()
+
+    def add(self, name, help_text, labels, value):
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = (help_text, [])
+        family[1].append((labels, value))
+
+    def render(self):
+        lines = []
+        for name, (help_text, samples) in self._families.items():
+            lines.append("# HELP {} {}".format(name, help_text.replace('\\', '\\\\').replace('\n', '\\n')))
+            lines.append("# TYPE {} gauge".format(name))
+            for labels, value in samples:
+                lines.append("{}{{{}}} {}".format(name, _labels(labels), repr(float(value))))
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serve the latest rendering of the metrics."""
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = self.server.exporter.snapshot
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _MetricsServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class MetricsExporter(object):
+    """HTTP server of Prometheus metrics, polling its devices from a background thread."""
+    def __init__(self, devices, server_address=('127.0.0.1', 0), interval=5.0, max_workers=None):
+        """Create the exporter and bind its HTTP server to `server_address`.
+
+        Args:
+            devices (dict): Compressor and Inverter objects, keyed by the name used in the device label.
+            server_address (tuple): (host, port) to listen on. Port 0 chooses a free port.
+            interval (float): time between polls of the devices in seconds.
+            max_workers (int): number of threads polling the devices. Defaults to one per device.
+        """
+        #: OrderedDict: the devices, keyed by name
+        self.devices = OrderedDict(devices)
+
+        self.interval = interval
+
+        #: bytes: the latest rendering of the metrics
+        self.snapshot = b''
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or max(len(self.devices), 1))
+        self._server = _MetricsServer(server_address, _MetricsRequestHandler)
+        self._server.exporter = self
+        self._stop = threading.Event()
+        self._threads = []
+
+    @property
+    def host(self):
+        """str: address the server is listening on."""
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        """int: TCP port the server is listening on."""
+        return self._server.server_address[1]
+
+    def _poll_one(self, device):
+        """Update one device.
+
+        Returns:
+            tuple: (ok, time taken in seconds)."""
+        start = monotonic()
+        try:
+            device.update()
+        except Exception:
+            return False, monotonic() - start
+        return True, monotonic() - start
+
+    def _add_device(self, families, name, device, ok, elapsed, t):
+        is_compressor = isinstance(device, wsma_cryostat_compressor.Compressor)
+        prefix = metric_prefix + ('compressor_' if is_compressor else 'inverter_')
+        labels = OrderedDict(device=name)
+
+        families.add(metric_prefix + 'up', "1 if the last poll of the device succeeded, 0 otherwise.", labels, ok)
+        families.add(metric_prefix + 'poll_duration_seconds', "Time taken by the last poll of the device.",
+                     labels, elapsed)
+        if not ok:
+            return
+        families.add(metric_prefix + 'last_poll_timestamp_seconds', "Unix time of the last successful poll.",
+                     labels, t)
+
+        for field in device._monitor_names:
+            register = device._registers[field]
+            families.add(prefix + field, _help(register, device), labels,
+                         register.value(getattr(device, register.attr)))
+
+        if is_compressor:
+            for kind, flags in (('warning', device.warning_flags), ('error', device.error_flags)):
+                for flag in wsma_cryostat_compressor.CompressorFlag:
+                    families.add(prefix + kind, "1 if the compressor reports the {} flag.".format(kind),
+                                 OrderedDict(device=name, flag=flag.name), flag in flags)
+
+    def poll(self):
+        """Poll all of the devices in parallel, and render the metrics.
+
+        Returns:
+            bytes: the new rendering, also stored in self.snapshot."""
+        t = time()
+        names = list(self.devices)
+        results = list(self._executor.map(self._poll_one, [self.devices[n] for n in names]))
+        families = _Families()
+        for name, (ok, elapsed) in zip(names, results):
+            self._add_device(families, name, self.devices[name], ok, elapsed, t)
+        self.snapshot = families.render().encode('utf-8')
+        return self.snapshot
+
+    def _poll_forever(self):
+        deadline = monotonic()
+        while True:
+            now = monotonic()
+            deadline = wsma_cryostat_compressor._next_deadline(deadline, self.interval, now)
+            if self._stop.wait(deadline - now):
+                return
+            self.poll()
+
+    def start(self):
+        """Poll the devices and serve the metrics from background threads.
+
+        The devices are polled once before this returns, so the first scrape has values.
+
+        Returns:
+            the exporter."""
+        self._stop.clear()
+        self.poll()
+        self._threads = [threading.Thread(target=self._server.serve_forever, name="MetricsExporter server"),
+                         threading.Thread(target=self._poll_forever, name="MetricsExporter poller")]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+        return self
+
+    def stop(self):
+        """Stop polling and serving, and close the listening socket."""
+        self._stop.set()
+        if self._threads:
+            self._server.shutdown()
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
+        self._server.server_close()
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
@@ -0,0 +1,76 @@
+"""
+Planning of Modbus reads for arbitrary groups of registers.
+
+plan_reads() coalesces the registers holding a group of values into the fewest read
+requests, merging registers that are close together into a single span as long as the
+span fits in one Modbus PDU.
+"""
+__version__ = '0.1.1'
+
+#: int: maximum number of registers that can be read in one Modbus request
+max_read_count = 125
+
+#: int: default maximum number of unwanted registers read to join two spans together
+default_max_gap = 8
+
+
+class ReadSpan(object):
+    """A contiguous block of registers read with one Modbus request."""
+    __slots__ = ('kind', 'start', 'count', 'names')
+
+    def __init__(self, kind, start, count, names):
+        """Describe a read span.
+
+        Args:
+            kind (str): 'input' or 'holding'.
+            start (int): address of the first register in the span.
+            count (int): number of registers in the span.
+            names (tuple): names of the values decoded from the span.
+        """
+        self.kind = kind
+        self.start = start
+        self.count = count
+        self.names = names
+
+    @property
+    def end(self):
+        """int: address of the first register after the span."""
+        return self.start + self.count
+
+    def __repr__(self):
+        return "ReadSpan({!r}, {}, {}, {!r})".format(self.kind, self.start, self.count, self.names)
+
+
+def plan_reads(registers, max_count=max_read_count, max_gap=default_max_gap):
+    """Plan the fewest read requests covering a group of registers.
+
+    Registers are sorted by address, and each is added to the current span if the gap to the
+    end of the span is at most `max_gap` registers and the span stays within `max_count`
+    registers. Otherwise a new span is started. Input and holding registers are never
+    mixed in one span.
+
+    Args:
+        registers (iterable): the Registers to read.
+        max_count (int): maximum number of registers in a span.
+        max_gap (int): maximum number of unwanted registers read to join two values into one span.
+
+    Returns:
+        list: ReadSpans covering every register, sorted by kind and address."""
+    spans = []
+    seen = set()
+    for register in sorted(registers, key=lambda r: (r.kind, r.address)):
+        if register.name in seen:
+            continue
+        seen.add(register.name)
+        if register.width > max_count:
+            raise ValueError("Register {} is wider than the maximum read count".format(register.name))
+
+        span = spans[-1] if spans else None
+        if (span is not None and span.kind == register.kind
+                and register.address - span.end <= max_gap
+                and max(register.end, span.end) - span.start <= max_count):
+            span.count = max(register.end, span.end) - span.start
+            span.names += (register.name,)
+        else:
+            spans.append(ReadSpan(register.kind, register.address, register.width, (register.name,)))
+    return spans
@@ -0,0 +1,163 @@
+"""
+Caching Modbus TCP proxy for a compressor or inverter.
+
+The compressor's panel and the RS485 gateway of the inverter serve few TCP clients at once,
+and answer slowly. A ModbusProxy holds a single connection to the device and serves any number
+of clients. Reads of registers described by the device's RegisterMap are widened to the planned
+read spans of the map, so that overlapping reads share one upstream request, and the result is
+served from a cache for `max_age` seconds. Clients waiting for a span that is being read receive
+the same result. Writes are forwarded one at a time, and clear the cache of the unit written to::
+
+    with ModbusProxy('192.168.42.12', server_address=('0.0.0.0', 5020)) as proxy:
+        comp = Compressor(ip_address='127.0.0.1', port=5020)
+"""
+__version__ = '0.1.1'
+
+import threading
+from time import monotonic
+
+from pymodbus.client.sync import ModbusTcpClient
+from pymodbus.exceptions import ConnectionException
+
+from wsma_cryostat_compressor.connection import ManagedClient
+from wsma_cryostat_compressor.inverter import default_read_gap as inverter_read_gap
+from wsma_cryostat_compressor.planner import default_max_gap, plan_reads
+from wsma_cryostat_compressor.registers import compressor_registers, inverter_registers
+from wsma_cryostat_compressor.server import ModbusServer, ModbusError, GATEWAY_TARGET_FAILED_TO_RESPOND
+
+#: float: default time in seconds for which cached registers are served
+default_max_age = 0.5
+
+
+class _CacheEntry(object):
+    """Cached registers of one read span of one unit."""
+    __slots__ = ('lock', 'time', 'registers')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.time = None
+        self.registers = None
+
+
+class ModbusProxy(ModbusServer):
+    """Modbus TCP server forwarding requests to one device, caching register reads."""
+    def __init__(self, address, port=502, registers=compressor_registers, server_address=('127.0.0.1', 0),
+                 max_age=default_max_age, timeout=3, max_gap=None, client=None):
+        """Create the proxy.
+
+        Args:
+            address (str): address of the device's Modbus TCP server.
+            port (int): TCP port of the device's Modbus TCP server.
+            registers (RegisterMap): the registers of the device.
+            server_address (tuple): (host, port) to listen on. Port 0 chooses a free port.
+            max_age (float): time in seconds for which cached registers are served.
+            timeout (float): timeout in seconds for each upstream transaction.
+            max_gap (int): maximum number of unwanted registers read to join two values into one span.
+                Defaults to the gap used by the Compressor or Inverter reading the registers, so that
+                the reads they make fit in one span.
+            client: Modbus client for the device, used instead of connecting to `address`.
+        """
+        ModbusServer.__init__(self, server_address)
+
+        if client is None:
+            client = ManagedClient(ModbusTcpClient(address, port=int(port), timeout=timeout))
+        self._client = client
+
+        #: RegisterMap: the registers of the device
+        self.registers = registers
+
+        self.max_age = max_age
+
+        #: int: number of requests sent to the device
+        self.upstream_requests = 0
+
+        #: int: number of reads served from the cache
+        self.hits = 0
+
+        if max_gap is None:
+            max_gap = inverter_read_gap if registers is inverter_registers else default_max_gap
+        self._spans = plan_reads(list(registers), max_gap=max_gap)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def stop(self):
+        """Stop serving requests and close the connection to the device."""
+        ModbusServer.stop(self)
+        self._client.close()
+
+    def _span_for(self, kind, address, count):
+        """Return the read span containing a block of registers, or None if there is none."""
+        for span in self._spans:
+            if span.kind == kind and span.start <= address and address + count <= span.end:
+                return span
+        return None
+
+    def _entry(self, unit, span):
+        key = (unit, span.kind, span.start)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _CacheEntry()
+            return entry
+
+    def _upstream(self, method, *args, **kwargs):
+        """Send a request to the device.
+
+        Raises:
+            ModbusError: with the device's exception code, or a gateway exception code if
+                the device did not respond."""
+        with self._lock:
+            self.upstream_requests += 1
+        try:
+            r = getattr(self._client, method)(*args, **kwargs)
+        except (ConnectionException, OSError):
+            raise ModbusError(GATEWAY_TARGET_FAILED_TO_RESPOND)
+        if r.isError():
+            raise ModbusError(getattr(r, 'exception_code', None) or GATEWAY_TARGET_FAILED_TO_RESPOND)
+        return r
+
+    def _read_upstream(self, unit, kind, address, count):
+        method = 'read_input_registers' if kind == 'input' else 'read_holding_registers'
+        return list(self._upstream(method, address, count=count, unit=unit).registers)
+
+    def read_registers(self, unit, kind, address, count):
+        span = self._span_for(kind, address, count)
+        if span is None:
+            return self._read_upstream(unit, kind, address, count)
+
+        requested = monotonic()
+        entry = self._entry(unit, span)
+        with entry.lock:
+            # A read that finished after this request arrived was in progress while it waited.
+            if entry.registers is not None and (entry.time >= requested or monotonic() - entry.time <= self.max_age):
+                with self._lock:
+                    self.hits += 1
+            else:
+                entry.registers = self._read_upstream(unit, span.kind, span.start, span.count)
+                entry.time = monotonic()
+            registers = entry.registers
+        offset = address - span.start
+        return registers[offset:offset + count]
+
+    def write_registers(self, unit, address, values):
+        with self._write_lock:
+            try:
+                if len(values) == 1:
+                    self._upstream('write_register', address, values[0], unit=unit)
+                else:
+                    self._upstream('write_registers', address, values, unit=unit)
+            finally:
+                self.invalidate(unit)
+
+    def invalidate(self, unit=None):
+        """Clear the cache.
+
+        Args:
+            unit (int): Modbus unit to clear the cache of, or None for all units.
+        """
+        with self._lock:
+            entries = [e for key, e in self._entries.items() if unit is None or key[0] == unit]
+        for entry in entries:
+            with entry.lock:
+                entry.registers = None
@@ -0,0 +1,51 @@
+"""
+Command line app running a caching Modbus TCP proxy in front of a compressor or inverter.
+"""
+__version__ = '0.1.1'
+
+import argparse
+
+import wsma_cryostat_compressor
+import wsma_cryostat_compressor.inverter
+from wsma_cryostat_compressor.proxy import ModbusProxy, default_max_age
+from wsma_cryostat_compressor.registers import compressor_registers, inverter_registers
+
+default_listen = '127.0.0.1'
+default_listen_port = 5020
+
+parser = argparse.ArgumentParser(description="Share a Cryomech compressor or inverter between many "
+                                             "Modbus TCP clients.")
+
+parser.add_argument("-d", "--device", choices=('compressor', 'inverter'), default='compressor',
+                    help="The kind of device behind the proxy")
+parser.add_argument("-a", "--address",
+                    help="The TCPIP address of the device's modbus server")
+parser.add_argument("-p", "--port", default=wsma_cryostat_compressor.default_port, type=int,
+                    help="The TCPIP port of the device's modbus server")
+parser.add_argument("-l", "--listen", default=default_listen,
+                    help="The address to accept clients on")
+parser.add_argument("-P", "--listen-port", default=default_listen_port, type=int,
+                    help="The TCPIP port to accept clients on")
+parser.add_argument("-m", "--max-age", default=default_max_age, type=float,
+                    help="Time in seconds for which cached registers are served")
+
+
+def main(args=None):
+    args = parser.parse_args(args=args)
+
+    if args.device == 'compressor':
+        address = args.address or wsma_cryostat_compressor.default_IP
+        registers = compressor_registers
+    else:
+        address = args.address or wsma_cryostat_compressor.inverter.default_address
+        registers = inverter_registers
+
+    proxy = ModbusProxy(address, port=args.port, registers=registers,
+                        server_address=(args.listen, args.listen_port), max_age=args.max_age)
+    print("Serving {} at {}:{} on {}:{}".format(args.device, address, args.port, proxy.host, proxy.port))
+    try:
+        proxy.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proxy.server_close()
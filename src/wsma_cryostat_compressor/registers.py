@@ -0,0 +1,326 @@
+"""
+Declarative register maps for the Compressor and Inverter.
+
+Each value held by a device is described once by a Register, giving its address, type, scale
+and unit. A RegisterMap collects the registers of one device, builds BlockDecoders for any
+group of them, and can generate the `_get_*`, `get_*` and property accessors of a device class.
+"""
+__version__ = '0.1.1'
+
+from collections import OrderedDict
+
+from wsma_cryostat_compressor.decoder import BlockDecoder, type_width
+from wsma_cryostat_compressor.planner import plan_reads, max_read_count, default_max_gap
+
+
+class Register(object):
+    """Description of a single value held in one or more Modbus registers."""
+    __slots__ = ('name', 'address', 'type', 'scale', 'unit', 'attr', 'kind', 'accessors', 'doc')
+
+    def __init__(self, name, address, value_type='uint16', scale=None, unit='', attr=None, kind='input',
+                 accessors=True, doc=''):
+        """Describe a register.
+
+        Args:
+            name (str): name of the value, used for the generated property and get_ method.
+            address (int): address of the first register holding the value.
+            value_type (str): one of 'uint16', 'int16', 'uint32', 'int32' or 'float32'.
+            scale (float): factor converting the raw value to physical units, or None if the raw value is used.
+            unit (str): unit of the scaled value, or the name of a device attribute giving the unit.
+            attr (str): name of the device attribute storing the raw value. Defaults to '_' + name.
+            kind (str): 'input' or 'holding'.
+            accessors (bool): whether accessors should be generated for this register.
+            doc (str): docstring of the generated property.
+        """
+        type_width(value_type)
+        self.name = name
+        self.address = address
+        self.type = value_type
+        self.scale = scale
+        self.unit = unit
+        self.attr = attr if attr is not None else '_' + name
+        self.kind = kind
+        self.accessors = accessors
+        self.doc = doc
+
+    @property
+    def width(self):
+        """int: number of 16 bit registers occupied by the value."""
+        return type_width(self.type)
+
+    @property
+    def end(self):
+        """int: address of the first register after the value."""
+        return self.address + self.width
+
+    def value(self, raw):
+        """Convert a raw register value to physical units.
+
+        Args:
+            raw: the raw value decoded from the register.
+
+        Returns:
+            the scaled value."""
+        if self.scale is None:
+            return raw
+        return raw * self.scale
+
+    def unit_for(self, device):
+        """Return the unit of the value for a particular device.
+
+        Args:
+            device: the device object the value was read from.
+
+        Returns:
+            str: the unit."""
+        return getattr(device, self.unit, self.unit)
+
+    def __repr__(self):
+        return "Register({!r}, {}, {!r})".format(self.name, self.address, self.type)
+
+
+class RegisterMap(object):
+    """Ordered collection of the Registers of one device."""
+    def __init__(self, registers, wordorder='little'):
+        """Create a register map.
+
+        Args:
+            registers (iterable): the Registers of the device.
+            wordorder (str): word order of 32 bit values, 'little' or 'big'.
+        """
+        self._registers = OrderedDict((r.name, r) for r in registers)
+        self.wordorder = wordorder
+        self._decoders = {}
+        self._plans = {}
+
+    def __getitem__(self, name):
+        return self._registers[name]
+
+    def __contains__(self, name):
+        return name in self._registers
+
+    def __iter__(self):
+        return iter(self._registers.values())
+
+    def __len__(self):
+        return len(self._registers)
+
+    @property
+    def names(self):
+        """tuple: names of all of the registers in the map."""
+        return tuple(self._registers)
+
+    def select(self, kind=None, names=None):
+        """Return the registers of a given kind, or with the given names.
+
+        Args:
+            kind (str): 'input' or 'holding', or None for either.
+            names (iterable): names of the registers to return, or None for all registers.
+
+        Returns:
+            list: the matching Registers."""
+        if names is None:
+            registers = list(self)
+        else:
+            registers = [self[n] for n in names]
+        return [r for r in registers if kind is None or r.kind == kind]
+
+    def span(self, names):
+        """Return the smallest block of registers containing the named values.
+
+        Args:
+            names (iterable): names of the registers.
+
+        Returns:
+            tuple: (start, count) of the block."""
+        registers = [self[n] for n in names]
+        start = min(r.address for r in registers)
+        return start, max(r.end for r in registers) - start
+
+    def decoder(self, names, start=None, count=None):
+        """Return a BlockDecoder for a block containing the named values.
+
+        Decoders are cached, so repeated calls with the same arguments are cheap.
+
+        Args:
+            names (iterable): names of the registers to decode.
+            start (int): address of the first register in the block. Defaults to the start of the first value.
+            count (int): number of registers in the block. Defaults to the end of the last value.
+
+        Returns:
+            BlockDecoder: decoder returning the raw values, with the register names as field names."""
+        names = tuple(names)
+        key = (names, start, count)
+        try:
+            return self._decoders[key]
+        except KeyError:
+            pass
+        if start is None:
+            start = self.span(names)[0]
+        fields = [(n, self[n].address, self[n].type) for n in names]
+        decoder = BlockDecoder(fields, start=start, count=count, wordorder=self.wordorder)
+        self._decoders[key] = decoder
+        return decoder
+
+    def plan(self, names, max_count=max_read_count, max_gap=default_max_gap):
+        """Plan the fewest read requests covering the named values.
+
+        Plans are cached, so repeated calls with the same arguments are cheap.
+
+        Args:
+            names (iterable): names of the registers to read.
+            max_count (int): maximum number of registers in one request.
+            max_gap (int): maximum number of unwanted registers read to join two values into one request.
+
+        Returns:
+            list: (ReadSpan, BlockDecoder) pairs, one for each request."""
+        names = tuple(names)
+        key = (names, max_count, max_gap)
+        try:
+            return self._plans[key]
+        except KeyError:
+            pass
+        plan = [(span, self.decoder(span.names, start=span.start, count=span.count))
+                for span in plan_reads([self[n] for n in names], max_count=max_count, max_gap=max_gap)]
+        self._plans[key] = plan
+        return plan
+
+
+def _make_property(register, via_value=False):
+    """Make a property returning the stored value of `register` in physical units.
+
+    If `via_value` is True, the stored value is fetched with the device's `_value(name)` method,
+    otherwise it is read directly from the register's attribute."""
+    attr = register.attr
+    name = register.name
+    scale = register.scale
+    if via_value:
+        def raw(self):
+            return self._value(name)
+    else:
+        def raw(self):
+            return getattr(self, attr)
+
+    if scale is None:
+        fget = raw
+    else:
+        def fget(self):
+            return raw(self) * scale
+    return property(fget, doc=register.doc)
+
+
+def _make_reader(register):
+    """Make a method reading `register` from the device and storing the raw value."""
+    def reader(self):
+        setattr(self, register.attr, self._read_register(register))
+    reader.__name__ = '_get_' + register.name
+    reader.__doc__ = "Read the current {} from the device.".format(register.name.replace('_', ' '))
+    return reader
+
+
+def _make_getter(register):
+    """Make a method reading `register` from the device and returning the value in physical units."""
+    name = register.name
+    private_getter = '_get_' + name
+
+    def getter(self):
+        getattr(self, private_getter)()
+        return getattr(self, name)
+    getter.__name__ = 'get_' + name
+    getter.__doc__ = "Read the current {} from the device.\n\n" \
+                     "        Returns:\n" \
+                     "            {}".format(name.replace('_', ' '), register.doc)
+    return getter
+
+
+def register_accessors(register_map):
+    """Class decorator adding accessors for each register in `register_map` to a device class.
+
+    For each Register with accessors enabled, adds a property `name`, a method `_get_name`
+    reading the value from the device into the register's attribute, and a method `get_name`
+    reading and returning the value. Accessors already defined by the class are not replaced.
+
+    The class must provide a `_read_register(register)` method returning the raw value of a register.
+    If the class provides a `_value(name)` method, the generated properties use it to fetch stored
+    values, so that the class can refresh them when they are used.
+
+    Args:
+        register_map (RegisterMap): the registers of the device.
+    """
+    def decorator(cls):
+        via_value = hasattr(cls, '_value')
+        for register in register_map:
+            if not register.accessors:
+                continue
+            for name, make in ((register.name, lambda r: _make_property(r, via_value)),
+                               ('_get_' + register.name, _make_reader),
+                               ('get_' + register.name, _make_getter)):
+                if name not in cls.__dict__:
+                    setattr(cls, name, make(register))
+        return cls
+    return decorator
+
+
+#: RegisterMap: registers of the Cryomech Compressor Digital Panel
+compressor_registers = RegisterMap([
+    Register('state_code', 1, 'uint16', attr='_state', accessors=False,
+             doc="int: State of the compressor."),
+    Register('enabled', 2, 'uint16',
+             doc="int: Enable state of the compressor.\n"
+                 "            values are one of:\n"
+                 "                0: Off\n"
+                 "                1: On"),
+    Register('warning_code', 3, 'float32', accessors=False,
+             doc="int: Warning state of the compressor."),
+    Register('error_code', 5, 'float32', accessors=False,
+             doc="int: Error state of the compressor."),
+    Register('coolant_in', 7, 'float32', unit='temp_unit',
+             doc="float: Coolant IN temperature in self.temp_units"),
+    Register('coolant_out', 9, 'float32', unit='temp_unit',
+             doc="float: Coolant OUT temperature in self.temp_units"),
+    Register('oil_temp', 11, 'float32', unit='temp_unit',
+             doc="float: Oil temperature in self.temp_units"),
+    Register('helium_temp', 13, 'float32', unit='temp_unit',
+             doc="float: Helium temperature in self.temp_units"),
+    Register('low_pressure', 15, 'float32', unit='press_unit', attr='_low_press',
+             doc="float: Low side pressure in self.press_units"),
+    Register('low_pressure_average', 17, 'float32', unit='press_unit', attr='_low_press_avg',
+             doc="float: Average low side pressure in self.press_units"),
+    Register('high_pressure', 19, 'float32', unit='press_unit', attr='_high_press',
+             doc="float: High side pressure in self.press_units"),
+    Register('high_pressure_average', 21, 'float32', unit='press_unit', attr='_high_press_avg',
+             doc="float: Average high side pressure in self.press_units"),
+    Register('delta_pressure_average', 23, 'float32', unit='press_unit', attr='_delta_press_avg',
+             doc="float: Average pressure delta in self.press_units"),
+    Register('motor_current', 25, 'float32', unit='A',
+             doc="float: Motor current in Amps - ! Known to be garbage on the inverter compressors !"),
+    Register('hours', 27, 'float32', unit='h',
+             doc="float: Hours of operation"),
+    Register('pressure_scale', 29, 'uint16', attr='_press_scale', accessors=False,
+             doc="int: Pressure scale code."),
+    Register('temperature_scale', 30, 'uint16', attr='_temp_scale', accessors=False,
+             doc="int: Temperature scale code."),
+    Register('serial', 31, 'uint16', accessors=False,
+             doc="str: Serial number of the compressor"),
+    Register('model', 32, 'uint16', accessors=False,
+             doc="str: Model name of the compressor"),
+    Register('software_rev', 33, 'float32', accessors=False,
+             doc="str: Software revision of the compressor"),
+    Register('enable', 1, 'uint16', kind='holding', accessors=False,
+             doc="int: Enable/Disable command register."),
+], wordorder='little')
+
+#: RegisterMap: registers of the inverter, read through the RS485 Modbus server
+inverter_registers = RegisterMap([
+    Register('frequency_control', 0x0001, 'uint16', scale=0.01, unit='Hz', kind='holding', accessors=False,
+             doc="float: The frequency setting of the inverter in Hz."),
+    Register('frequency', 0x1001, 'int16', scale=0.01, unit='Hz', kind='holding',
+             doc="float: The frequency of the inverter in Hz.\n\n"
+                 "        Read only - set the frequency via the set_frequency method."),
+    Register('current', 0x1002, 'uint16', scale=0.1, unit='A', kind='holding',
+             doc="float: The output current of the inverter in Amps."),
+    Register('voltage', 0x1010, 'uint16', scale=0.1, unit='V', kind='holding',
+             doc="float: The output voltage of the inverter in Volts."),
+    Register('power', 0x1011, 'uint16', scale=0.1, unit='kW', kind='holding',
+             doc="float: The output power of the inverter in kW."),
+], wordorder='big')
@@ -0,0 +1,209 @@
+"""
+Retrying of Modbus reads, with a deadline and a circuit breaker.
+
+A RetryPolicy repeats a call that fails with a transient error, such as a timeout or a broken
+connection, waiting between attempts with exponential backoff and random jitter. No attempt is
+started that could not finish its wait before the deadline of the call. The function called can
+limit the timeout of each attempt to the time that remains, given by remaining(), so that the
+whole call ends at about the deadline and one bad read cannot stall a poll for long. The
+Compressor and Inverter do this, and make each attempt without the one resend of ManagedClient,
+so the policy alone decides how many requests are sent.
+
+Each device has its own RetryPolicy, which is also a circuit breaker: after a number of calls in
+a row have failed, further calls fail immediately with CircuitOpenError until `reset_timeout`
+has passed, when one trial call is let through to test whether the device has recovered.
+"""
+__version__ = '0.1.1'
+
+import random
+import threading
+from time import monotonic, sleep
+
+from pymodbus.exceptions import ConnectionException, ModbusIOException
+
+#: tuple: exceptions that are retried by default
+default_retry_on = (ModbusIOException, ConnectionException, OSError)
+
+#: str: state of a circuit breaker passing calls through
+CLOSED = 'closed'
+
+#: str: state of a circuit breaker failing calls immediately
+OPEN = 'open'
+
+#: str: state of a circuit breaker letting one trial call through
+HALF_OPEN = 'half-open'
+
+# default for the deadline of a call, meaning the deadline of the policy
+_policy_deadline = object()
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a device that has failed repeatedly."""
+
+
+class RetryPolicy(object):
+    """Retry policy and circuit breaker for the requests to one device."""
+    def __init__(self, attempts=3, backoff=0.05, max_backoff=1.0, deadline=2.0,
+                 failure_threshold=5, reset_timeout=10.0, retry_on=default_retry_on, seed=None):
+        """Create the policy.
+
+        Args:
+            attempts (int): maximum number of attempts for each call.
+            backoff (float): maximum wait in seconds before the first retry. The maximum doubles for each retry.
+            max_backoff (float): limit in seconds of the maximum wait between attempts.
+            deadline (float): time in seconds after the start of a call after which no retry is started,
+                and by which a function limiting its attempts with remaining() returns, or None for no deadline.
+            failure_threshold (int): number of failed calls in a row that opens the circuit breaker,
+                or None to never open it.
+            reset_timeout (float): time in seconds for which the circuit breaker stays open.
+            retry_on (tuple): exception classes that are retried and counted as failures.
+            seed (int): seed for the random jitter.
+        """
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.retry_on = retry_on
+
+        #: int: number of calls made
+        self.calls = 0
+
+        #: int: number of attempts repeated after a transient error
+        self.retries = 0
+
+        #: int: number of calls that failed after all their attempts
+        self.failures = 0
+
+        #: int: number of calls rejected by the open circuit breaker
+        self.rejected = 0
+
+        #: int: number of times the circuit breaker has opened
+        self.trips = 0
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened = None
+        self._trial = False
+        self._local = threading.local()
+
+    @property
+    def state(self):
+        """str: state of the circuit breaker, CLOSED, OPEN or HALF_OPEN."""
+        with self._lock:
+            if self._opened is None:
+                return CLOSED
+            if self._trial or monotonic() - self._opened >= self.reset_timeout:
+                return HALF_OPEN
+            return OPEN
+
+    def counters(self):
+        """Return the counters of the policy.
+
+        Returns:
+            dict: the number of calls, retries, failures, rejected calls and trips, and the breaker state."""
+        return {'calls': self.calls, 'retries': self.retries, 'failures': self.failures,
+                'rejected': self.rejected, 'trips': self.trips, 'state': self.state}
+
+    def reset(self):
+        """Close the circuit breaker."""
+        with self._lock:
+            self._consecutive = 0
+            self._opened = None
+            self._trial = False
+
+    def _admit(self):
+        """Check whether the circuit breaker lets a call through.
+
+        Returns:
+            bool: True if the call is a trial call of a half open breaker."""
+        with self._lock:
+            self.calls += 1
+            if self._opened is None:
+                return False
+            if not self._trial and monotonic() - self._opened >= self.reset_timeout:
+                self._trial = True
+                return True
+            self.rejected += 1
+        raise CircuitOpenError("Circuit breaker open after {} failed calls".format(self.failure_threshold))
+
+    def _record(self, ok, trial):
+        with self._lock:
+            if trial:
+                self._trial = False
+            if ok:
+                self._consecutive = 0
+                self._opened = None
+                return
+            self.failures += 1
+            self._consecutive += 1
+            if trial or (self._opened is None and self.failure_threshold is not None
+                         and self._consecutive >= self.failure_threshold):
+                self.trips += 1
+                self._opened = monotonic()
+
+    def wait(self, retry):
+        """Return a random wait before a retry, with exponential backoff.
+
+        Args:
+            retry (int): the number of the retry, starting at 0.
+
+        Returns:
+            float: wait in seconds."""
+        with self._lock:
+            return self._random.uniform(0, min(self.max_backoff, self.backoff * 2 ** retry))
+
+    def remaining(self):
+        """Return the time left before the deadline of the call being made by this thread.
+
+        Returns:
+            float: time in seconds, or None if the call has no deadline or no call is being made."""
+        end = getattr(self._local, 'end', None)
+        return None if end is None else max(end - monotonic(), 0.0)
+
+    def call(self, func, *args, deadline=_policy_deadline, **kwargs):
+        """Call a function, retrying if it raises one of self.retry_on.
+
+        Args:
+            func (callable): the function.
+            args: positional arguments of the function.
+            deadline (float): time in seconds after which no retry is started, or None for no deadline.
+                Defaults to self.deadline.
+            kwargs: keyword arguments of the function.
+
+        Returns:
+            the result of the function.
+
+        Raises:
+            CircuitOpenError: if the circuit breaker is open.
+            the last exception raised by the function, if every attempt failed."""
+        trial = self._admit()
+        if deadline is _policy_deadline:
+            deadline = self.deadline
+        end = None if deadline is None else monotonic() + deadline
+        self._local.end = end
+        try:
+            attempt = 0
+            while True:
+                try:
+                    result = func(*args, **kwargs)
+                except self.retry_on:
+                    delay = self.wait(attempt)
+                    attempt += 1
+                    if trial or attempt >= self.attempts or (end is not None and monotonic() + delay >= end):
+                        self._record(False, trial)
+                        raise
+                    with self._lock:
+                        self.retries += 1
+                    sleep(delay)
+                except Exception:
+                    # The device answered, so it is reachable.
+                    self._record(True, trial)
+                    raise
+                else:
+                    self._record(True, trial)
+                    return result
+        finally:
+            self._local.end = None
@@ -0,0 +1,171 @@
+"""
+Adaptive polling of a compressor.
+
+A PollScheduler reads each value of a Compressor on its own schedule. The interval between reads
+of a value is the base interval of the compressor's operating state, multiplied by a factor for
+the value: pressures and the state are read fast while the compressor is Starting or Stopping,
+temperatures less often, and the running hours rarely, while an idle compressor is polled
+slowly. Values that are due together are read with one planned read, and the Modbus requests
+made are kept within a budget of requests per second::
+
+    scheduler = PollScheduler(comp, budget=5.0)
+    for record in scheduler.stream():
+        print(record)
+"""
+__version__ = '0.1.1'
+
+from time import monotonic, sleep, time
+
+#: dict: default base poll interval in seconds for each operating state
+default_state_intervals = {
+    0: 10.0,    # Ready to start
+    2: 0.5,     # Starting
+    3: 2.0,     # Running
+    5: 0.5,     # Stopping
+    6: 1.0,     # Error Lockout
+    7: 1.0,     # Error
+    8: 1.0,     # Helium Overtemp
+    9: 1.0,     # Power Related Error
+    15: 1.0,    # Recovered From Error
+}
+
+#: float: default base poll interval in seconds in states not in the table
+default_interval = 1.0
+
+#: dict: default multiple of the base interval at which each value is read. Other values are read every base interval.
+default_field_factors = {
+    'coolant_in': 4.0,
+    'coolant_out': 4.0,
+    'oil_temp': 4.0,
+    'helium_temp': 2.0,
+    'motor_current': 2.0,
+    'hours': 60.0,
+}
+
+
+class PollScheduler(object):
+    """Poll the values of a Compressor at rates that depend on its operating state."""
+    def __init__(self, compressor, fields=None, state_intervals=None, field_factors=None, budget=None):
+        """Create the scheduler. All of the values are due to be read by the first poll.
+
+        Args:
+            compressor (Compressor): the compressor to poll.
+            fields (iterable): names of the values to read. Defaults to the values read by update().
+                The state_code is always read, as it sets the schedule.
+            state_intervals (dict): base poll interval in seconds for each state code.
+                Defaults to default_state_intervals.
+            field_factors (dict): multiple of the base interval at which each value is read.
+                Defaults to default_field_factors.
+            budget (float): maximum average number of Modbus requests per second, or None for no limit.
+        """
+        self.compressor = compressor
+
+        fields = tuple(fields) if fields is not None else compressor._monitor_names
+        if 'state_code' not in fields:
+            fields = ('state_code',) + fields
+
+        #: tuple: names of the values read
+        self.fields = fields
+
+        self.state_intervals = dict(default_state_intervals if state_intervals is None else state_intervals)
+        self.field_factors = dict(default_field_factors if field_factors is None else field_factors)
+        self.budget = budget
+
+        #: int: number of Modbus requests made
+        self.requests = 0
+
+        #: int: number of polls delayed to stay within the budget
+        self.throttled = 0
+
+        self._due = dict((f, 0.0) for f in self.fields)
+        self._state = None
+        self._tokens = max(budget, 1.0) if budget else 0.0
+        self._refilled = monotonic()
+
+    def interval(self, field, state=None):
+        """Return the interval between reads of a value.
+
+        Args:
+            field (str): name of the value.
+            state (int): operating state code. Defaults to the last state read.
+
+        Returns:
+            float: interval in seconds."""
+        if state is None:
+            state = self._state
+        base = self.state_intervals.get(state, default_interval)
+        return base * self.field_factors.get(field, 1.0)
+
+    def next_due(self):
+        """Return the time the next value is due to be read.
+
+        Returns:
+            float: time on the monotonic() clock."""
+        return min(self._due.values())
+
+    def _spend(self, cost):
+        """Wait until `cost` requests can be made within the budget, and take them from it."""
+        if not self.budget:
+            return
+        burst = max(self.budget, 1.0)
+        now = monotonic()
+        self._tokens = min(burst, self._tokens + (now - self._refilled) * self.budget)
+        self._refilled = now
+        needed = min(cost, burst)
+        if self._tokens < needed:
+            self.throttled += 1
+            sleep((needed - self._tokens) / self.budget)
+            now = monotonic()
+            self._tokens = min(burst, self._tokens + (now - self._refilled) * self.budget)
+            self._refilled = now
+        self._tokens -= cost
+
+    def poll(self):
+        """Read the values that are due.
+
+        Returns:
+            dict: the Unix time of the reading under 'time', and the values read, keyed by name,
+            or None if no value is due."""
+        now = monotonic()
+        due = [f for f in self.fields if self._due[f] <= now]
+        if not due:
+            return None
+        if 'state_code' not in due:
+            # Read the state with any other value, so the schedule reacts to changes in state.
+            due.insert(0, 'state_code')
+
+        comp = self.compressor
+        cost = len(comp._registers.plan(due, max_gap=comp.read_gap))
+        self._spend(cost)
+        record = {'time': time()}
+        record.update(comp.read(due))
+        self.requests += cost
+
+        now = monotonic()
+        state = record['state_code']
+        if state != self._state:
+            # Bring forward reads that are now due sooner.
+            self._state = state
+            for f in self.fields:
+                self._due[f] = min(self._due[f], now + self.interval(f))
+        for f in due:
+            self._due[f] = now + self.interval(f)
+        return record
+
+    def stream(self, count=None):
+        """Poll the compressor, waiting between polls until values are due.
+
+        Args:
+            count (int): number of polls to make, or None to continue indefinitely.
+
+        Yields:
+            dict: the Unix time of each reading under 'time', and the values read, keyed by name."""
+        n = 0
+        while count is None or n < count:
+            wait = self.next_due() - monotonic()
+            if wait > 0:
+                sleep(wait)
+            record = self.poll()
+            if record is not None:
+                yield record
+                n += 1
@@ -0,0 +1,199 @@
+"""
+Minimal threaded Modbus TCP server.
+
+ModbusServer handles the Modbus TCP framing and the register read and write function codes
+used by the Compressor and Inverter (3, 4, 6 and 16), and passes each request to a subclass.
+It is the base of the local simulator and of the caching proxy.
+"""
+__version__ = '0.1.1'
+
+import socketserver
+import struct
+import threading
+
+#: int: function code for Read Holding Registers
+READ_HOLDING_REGISTERS = 3
+
+#: int: function code for Read Input Registers
+READ_INPUT_REGISTERS = 4
+
+#: int: function code for Write Single Register
+WRITE_SINGLE_REGISTER = 6
+
+#: int: function code for Write Multiple Registers
+WRITE_MULTIPLE_REGISTERS = 16
+
+#: int: exception code for an unsupported function
+ILLEGAL_FUNCTION = 1
+
+#: int: exception code for a request for registers that do not exist
+ILLEGAL_DATA_ADDRESS = 2
+
+#: int: exception code for a malformed request
+ILLEGAL_DATA_VALUE = 3
+
+#: int: exception code for a failure of the server while handling the request
+SLAVE_DEVICE_FAILURE = 4
+
+#: int: exception code from a gateway that cannot reach the target device
+GATEWAY_PATH_UNAVAILABLE = 10
+
+#: int: exception code from a gateway whose target device did not respond
+GATEWAY_TARGET_FAILED_TO_RESPOND = 11
+
+_mbap = struct.Struct('>HHHB')
+_address_count = struct.Struct('>HH')
+
+
+class ModbusError(Exception):
+    """Error reported to the client as a Modbus exception response."""
+    def __init__(self, code):
+        super(ModbusError, self).__init__("Modbus exception code {}".format(code))
+        self.code = code
+
+
+class DropConnection(Exception):
+    """Raised while handling a request to close the connection without responding."""
+
+
+class _ModbusRequestHandler(socketserver.BaseRequestHandler):
+    """Read Modbus TCP frames from a client and write the responses."""
+    def _recv_exactly(self, n):
+        data = b''
+        while len(data) < n:
+            chunk = self.request.recv(n - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def handle(self):
+        while True:
+            header = self._recv_exactly(_mbap.size)
+            if header is None:
+                return
+            transaction, protocol, length, unit = _mbap.unpack(header)
+            pdu = self._recv_exactly(length - 1)
+            if pdu is None:
+                return
+            try:
+                response = self.server.handle_pdu(unit, pdu)
+            except DropConnection:
+                return
+            if response is None:
+                continue
+            self.request.sendall(_mbap.pack(transaction, protocol, len(response) + 1, unit) + response)
+
+
+class ModbusServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Threaded Modbus TCP server.
+
+    Subclasses implement read_registers() and write_registers().
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, server_address=('127.0.0.1', 0)):
+        """Create the server and bind it to `server_address`.
+
+        Args:
+            server_address (tuple): (host, port) to listen on. Port 0 chooses a free port.
+        """
+        socketserver.TCPServer.__init__(self, server_address, _ModbusRequestHandler)
+        self._thread = None
+
+    @property
+    def host(self):
+        """str: address the server is listening on."""
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        """int: TCP port the server is listening on."""
+        return self.server_address[1]
+
+    def start(self):
+        """Serve requests from a background thread.
+
+        Returns:
+            the server, so that `server = ModbusServer().start()` can be used."""
+        self._thread = threading.Thread(target=self.serve_forever, name="{}:{}".format(self.host, self.port))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving requests and close the listening socket."""
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def handle_pdu(self, unit, pdu):
+        """Handle one request.
+
+        Args:
+            unit (int): Modbus unit the request is addressed to.
+            pdu (bytes): the request, starting with the function code.
+
+        Returns:
+            bytes: the response, or None to send no response."""
+        function = pdu[0]
+        try:
+            if function in (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS):
+                if len(pdu) != 5:
+                    raise ModbusError(ILLEGAL_DATA_VALUE)
+                address, count = _address_count.unpack_from(pdu, 1)
+                if not 1 <= count <= 125:
+                    raise ModbusError(ILLEGAL_DATA_VALUE)
+                kind = 'holding' if function == READ_HOLDING_REGISTERS else 'input'
+                registers = self.read_registers(unit, kind, address, count)
+                return struct.pack('>BB{}H'.format(count), function, 2 * count, *registers)
+            elif function == WRITE_SINGLE_REGISTER:
+                if len(pdu) != 5:
+                    raise ModbusError(ILLEGAL_DATA_VALUE)
+                address, value = _address_count.unpack_from(pdu, 1)
+                self.write_registers(unit, address, [value])
+                return pdu
+            elif function == WRITE_MULTIPLE_REGISTERS:
+                address, count = _address_count.unpack_from(pdu, 1)
+                if len(pdu) != 6 + 2 * count or pdu[5] != 2 * count:
+                    raise ModbusError(ILLEGAL_DATA_VALUE)
+                values = struct.unpack_from('>{}H'.format(count), pdu, 6)
+                self.write_registers(unit, address, list(values))
+                return pdu[:5]
+            else:
+                raise ModbusError(ILLEGAL_FUNCTION)
+        except ModbusError as e:
+            return struct.pack('>BB', function | 0x80, e.code)
+        except struct.error:
+            return struct.pack('>BB', function | 0x80, ILLEGAL_DATA_VALUE)
+
+    def read_registers(self, unit, kind, address, count):
+        """Read registers. Implemented by subclasses.
+
+        Args:
+            unit (int): Modbus unit of the request.
+            kind (str): 'input' or 'holding'.
+            address (int): address of the first register.
+            count (int): number of registers.
+
+        Returns:
+            sequence: `count` 16 bit register values."""
+        raise ModbusError(ILLEGAL_FUNCTION)
+
+    def write_registers(self, unit, address, values):
+        """Write holding registers. Implemented by subclasses.
+
+        Args:
+            unit (int): Modbus unit of the request.
+            address (int): address of the first register.
+            values (list): 16 bit register values to write."""
+        raise ModbusError(ILLEGAL_FUNCTION)
@@ -0,0 +1,234 @@
+"""
+Publishing of device snapshots through shared memory.
+
+A SnapshotDaemon polls one Compressor or Inverter and publishes each reading into a fixed
+layout shared memory block with a SnapshotPublisher. Any number of processes can then read
+the latest reading with a SnapshotReader, without opening their own Modbus connections.
+
+The block is protected by a sequence lock: the writer makes the sequence number odd while it
+writes a reading and even when it is done, and readers retry if the number was odd or changed
+while they copied the reading. Readers never block the writer.
+
+Requires Python 3.8 or later for multiprocessing.shared_memory.
+"""
+__version__ = '0.1.1'
+
+import struct
+import threading
+from multiprocessing import shared_memory
+from time import monotonic, time
+
+import wsma_cryostat_compressor
+
+#: bytes: identifies a snapshot block
+_magic = b'WSMASNAP'
+
+# magic, header size, number of fields, sequence number
+_header = struct.Struct('<8sIIQ')
+
+#: int: offset of the sequence number in the block
+_seq_offset = 16
+
+_seq = struct.Struct('<Q')
+
+#: set: names of the blocks published by this process
+_published = set()
+
+
+class SnapshotPublisher(object):
+    """Writer of the latest reading of a device into a shared memory block."""
+    def __init__(self, name, fields):
+        """Create the shared memory block.
+
+        Args:
+            name (str): name of the shared memory block.
+            fields (iterable): names of the values in each reading.
+        """
+        #: tuple: names of the values in each reading
+        self.fields = tuple(fields)
+
+        names = "\n".join(self.fields).encode('utf-8')
+        header_size = (_header.size + len(names) + 7) // 8 * 8
+        self._data = struct.Struct('<{}d'.format(len(self.fields) + 1))
+        self._header_size = header_size
+
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=header_size + self._data.size)
+        buf = self._shm.buf
+        _header.pack_into(buf, 0, _magic, header_size, len(self.fields), 0)
+        buf[_header.size:_header.size + len(names)] = names
+        self._seq = 0
+        _published.add(self._shm._name)
+
+    @property
+    def name(self):
+        """str: name of the shared memory block."""
+        return self._shm.name
+
+    def publish(self, t, values):
+        """Publish a reading.
+
+        Args:
+            t (float): Unix time of the reading.
+            values (sequence): the values, in the order of self.fields.
+        """
+        buf = self._shm.buf
+        self._seq += 1
+        _seq.pack_into(buf, _seq_offset, self._seq)
+        self._data.pack_into(buf, self._header_size, t, *values)
+        self._seq += 1
+        _seq.pack_into(buf, _seq_offset, self._seq)
+
+    def close(self, unlink=True):
+        """Close the block, and by default remove it.
+
+        Args:
+            unlink (bool): whether to remove the block, so that readers can no longer attach to it.
+        """
+        self._shm.close()
+        if unlink:
+            _published.discard(self._shm._name)
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SnapshotReader(object):
+    """Reader of the latest reading published by a SnapshotPublisher, possibly in another process."""
+    def __init__(self, name):
+        """Attach to a shared memory block.
+
+        Args:
+            name (str): name of the shared memory block.
+        """
+        self._shm = shared_memory.SharedMemory(name=name)
+        if self._shm._name not in _published:
+            # The block belongs to the publisher, so stop this process removing it on exit.
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+
+        magic, header_size, n, _ = _header.unpack_from(self._shm.buf, 0)
+        if magic != _magic:
+            self._shm.close()
+            raise ValueError("{} is not a snapshot block".format(name))
+        names = bytes(self._shm.buf[_header.size:header_size]).rstrip(b'\0').decode('utf-8')
+
+        #: tuple: names of the values in each reading
+        self.fields = tuple(names.split("\n")) if n else ()
+
+        self._header_size = header_size
+        self._data = struct.Struct('<{}d'.format(n + 1))
+
+    def read_raw(self, retries=1000):
+        """Read the latest reading.
+
+        Args:
+            retries (int): number of attempts to read a consistent reading.
+
+        Returns:
+            tuple: (sequence, values), where sequence is 0 if nothing has been published yet, and
+            values is a tuple of the time followed by the value of each field."""
+        buf = self._shm.buf
+        for _ in range(retries):
+            seq = _seq.unpack_from(buf, _seq_offset)[0]
+            if seq & 1:
+                continue
+            values = self._data.unpack_from(buf, self._header_size)
+            if _seq.unpack_from(buf, _seq_offset)[0] == seq:
+                return seq // 2, values
+        raise RuntimeError("Could not read a consistent snapshot")
+
+    def read(self):
+        """Read the latest reading.
+
+        Returns:
+            dict: the Unix time of the reading under 'time', the number of readings published under
+            'sequence', and the values keyed by field name, or None if nothing has been published yet."""
+        seq, values = self.read_raw()
+        if seq == 0:
+            return None
+        record = {'time': values[0], 'sequence': seq}
+        record.update(zip(self.fields, values[1:]))
+        return record
+
+    def close(self):
+        """Detach from the shared memory block."""
+        self._shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SnapshotDaemon(object):
+    """Poll a Compressor or Inverter and publish every reading to shared memory."""
+    def __init__(self, device, name, interval=1.0, fields=None):
+        """Create the daemon and its shared memory block.
+
+        Args:
+            device: the Compressor or Inverter to poll.
+            name (str): name of the shared memory block.
+            interval (float): time between polls in seconds.
+            fields (iterable): names of the properties of the device to publish.
+                Defaults to the values read by the device's update().
+        """
+        self.device = device
+        self.interval = interval
+        self.fields = tuple(fields) if fields is not None else device._monitor_names
+        self.publisher = SnapshotPublisher(name, self.fields)
+
+        #: int: number of polls that failed
+        self.errors = 0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        """Poll the device once and publish the reading."""
+        t = time()
+        self.device.update()
+        self.publisher.publish(t, [getattr(self.device, f) for f in self.fields])
+
+    def serve_forever(self):
+        """Poll the device at a fixed cadence until stop() is called.
+
+        Failed polls are counted in self.errors, and the previous reading is left published."""
+        deadline = monotonic()
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception:
+                self.errors += 1
+            now = monotonic()
+            deadline = wsma_cryostat_compressor._next_deadline(deadline, self.interval, now)
+            self._stop.wait(deadline - now)
+
+    def start(self):
+        """Poll the device from a background thread.
+
+        Returns:
+            the daemon."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.serve_forever, name="SnapshotDaemon {}".format(self.publisher.name))
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop polling and remove the shared memory block."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.publisher.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
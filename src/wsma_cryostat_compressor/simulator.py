@@ -0,0 +1,231 @@
+"""
+Local Modbus TCP simulator of the Compressor Digital Panel and the inverter.
+
+A ModbusSimulator serves the registers of a SimulatedCompressor or SimulatedInverter on a local
+TCP port, so that Compressor and Inverter objects can be exercised without hardware. Latency,
+jitter and faults can be injected to benchmark polling and test error handling::
+
+    with ModbusSimulator(SimulatedCompressor(), latency=0.01) as sim:
+        comp = Compressor(ip_address=sim.host, port=sim.port)
+"""
+__version__ = '0.1.1'
+
+import random
+import threading
+from time import monotonic, sleep
+
+from wsma_cryostat_compressor.registers import compressor_registers, inverter_registers
+from wsma_cryostat_compressor.server import (ModbusServer, ModbusError, DropConnection,
+                                             ILLEGAL_DATA_ADDRESS, SLAVE_DEVICE_FAILURE)
+
+
+class SimulatedDevice(object):
+    """Registers of a simulated device, described by a RegisterMap.
+
+    Values are stored in units of the raw register values, keyed by register name. Registers
+    not described by the map read as zero.
+    """
+    #: RegisterMap: the registers of the device
+    _registers = None
+
+    def __init__(self, **values):
+        """Create the device.
+
+        Args:
+            values: initial raw values of the registers, keyed by register name.
+        """
+        self.values = dict((r.name, 0) for r in self._registers)
+        for name, value in values.items():
+            if name not in self._registers:
+                raise ValueError("Unknown register {}".format(name))
+            self.values[name] = value
+        self.lock = threading.RLock()
+
+    def _tick(self):
+        """Advance any time dependent state. Called before each request."""
+
+    def read(self, kind, address, count):
+        """Read a block of registers.
+
+        Args:
+            kind (str): 'input' or 'holding'.
+            address (int): address of the first register.
+            count (int): number of registers.
+
+        Returns:
+            list: the 16 bit register values."""
+        with self.lock:
+            self._tick()
+            result = [0] * count
+            for register in self._registers.select(kind=kind):
+                if register.end <= address or register.address >= address + count:
+                    continue
+                encoded = self._registers.decoder((register.name,)).encode((self.values[register.name],))
+                for i, value in enumerate(encoded):
+                    offset = register.address + i - address
+                    if 0 <= offset < count:
+                        result[offset] = value
+            return result
+
+    def write(self, address, values):
+        """Write holding registers.
+
+        Args:
+            address (int): address of the first register.
+            values (list): the 16 bit register values."""
+        with self.lock:
+            self._tick()
+            for i, value in enumerate(values):
+                self.write_register(address + i, value)
+
+    def write_register(self, address, value):
+        """Write one holding register. Subclasses respond to writes here.
+
+        Args:
+            address (int): address of the register.
+            value (int): the 16 bit value."""
+        for register in self._registers.select(kind='holding'):
+            if register.address == address and register.width == 1:
+                self.values[register.name] = value
+                return
+        raise ModbusError(ILLEGAL_DATA_ADDRESS)
+
+
+class SimulatedCompressor(SimulatedDevice):
+    """Simulated Compressor Digital Panel.
+
+    Turning the compressor on takes it through Starting to Running, and turning it off takes
+    it through Stopping to Ready to start, each after `transition_time` seconds.
+    """
+    _registers = compressor_registers
+
+    #: dict: default raw values of the registers of a running CPA28H4 compressor
+    defaults = {
+        'state_code': 3, 'enabled': 1, 'warning_code': 0.0, 'error_code': 0.0,
+        'coolant_in': 20.5, 'coolant_out': 31.2, 'oil_temp': 35.8, 'helium_temp': 68.1,
+        'low_pressure': 95.4, 'low_pressure_average': 95.6, 'high_pressure': 298.7,
+        'high_pressure_average': 299.0, 'delta_pressure_average': 203.4,
+        'motor_current': 12.1, 'hours': 12345.6,
+        'pressure_scale': 0, 'temperature_scale': 1, 'serial': 1234, 'model': 0x0508,
+        'software_rev': 1.25,
+    }
+
+    def __init__(self, transition_time=0.5, **values):
+        """Create the simulated compressor.
+
+        Args:
+            transition_time (float): time in seconds spent Starting or Stopping.
+            values: raw values of the registers to use instead of the defaults.
+        """
+        initial = dict(self.defaults)
+        initial.update(values)
+        super(SimulatedCompressor, self).__init__(**initial)
+        self.transition_time = transition_time
+        self._transition_end = None
+
+    def _tick(self):
+        if self._transition_end is not None and monotonic() >= self._transition_end:
+            self._transition_end = None
+            state = self.values['state_code']
+            if state == 2:
+                self.values['state_code'] = 3
+            elif state == 5:
+                self.values['state_code'] = 0
+
+    def write_register(self, address, value):
+        if address != self._registers['enable'].address:
+            raise ModbusError(ILLEGAL_DATA_ADDRESS)
+        state = self.values['state_code']
+        if value == 0x0001 and state == 0:
+            self.values['state_code'] = 2
+            self.values['enabled'] = 1
+            self._transition_end = monotonic() + self.transition_time
+        elif value == 0x00FF and state in (2, 3):
+            self.values['state_code'] = 5
+            self.values['enabled'] = 0
+            self._transition_end = monotonic() + self.transition_time
+
+
+class SimulatedInverter(SimulatedDevice):
+    """Simulated inverter. The output frequency follows the frequency setting immediately."""
+    _registers = inverter_registers
+
+    #: dict: default raw values of the registers
+    defaults = {
+        'frequency_control': 6000, 'frequency': 6000, 'current': 95, 'voltage': 2010, 'power': 32,
+    }
+
+    def __init__(self, **values):
+        """Create the simulated inverter.
+
+        Args:
+            values: raw values of the registers to use instead of the defaults.
+        """
+        initial = dict(self.defaults)
+        initial.update(values)
+        super(SimulatedInverter, self).__init__(**initial)
+
+    def write_register(self, address, value):
+        super(SimulatedInverter, self).write_register(address, value)
+        if address == self._registers['frequency_control'].address:
+            self.values['frequency'] = value
+
+
+class ModbusSimulator(ModbusServer):
+    """Modbus TCP server for a simulated device, with optional latency and fault injection.
+
+    The device answers requests for any unit.
+    """
+    def __init__(self, device, server_address=('127.0.0.1', 0), latency=0.0, jitter=0.0,
+                 error_rate=0.0, drop_rate=0.0, timeout_rate=0.0, seed=None):
+        """Create the simulator.
+
+        Args:
+            device (SimulatedDevice): the device to simulate.
+            server_address (tuple): (host, port) to listen on. Port 0 chooses a free port.
+            latency (float): delay in seconds before each response.
+            jitter (float): maximum additional random delay in seconds before each response.
+            error_rate (float): probability of answering a request with a Modbus exception.
+            drop_rate (float): probability of closing the connection instead of answering.
+            timeout_rate (float): probability of not answering a request at all.
+            seed (int): seed for the random faults and jitter.
+        """
+        ModbusServer.__init__(self, server_address)
+
+        #: SimulatedDevice: the simulated device
+        self.device = device
+
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.timeout_rate = timeout_rate
+
+        #: int: number of requests received
+        self.requests = 0
+
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def handle_pdu(self, unit, pdu):
+        with self._random_lock:
+            self.requests += 1
+            delay = self.latency + self.jitter * self._random.random()
+            fault = self._random.random()
+        if delay > 0:
+            sleep(delay)
+        if fault < self.drop_rate:
+            raise DropConnection()
+        fault -= self.drop_rate
+        if fault < self.timeout_rate:
+            return None
+        fault -= self.timeout_rate
+        if fault < self.error_rate:
+            return bytes((pdu[0] | 0x80, SLAVE_DEVICE_FAILURE))
+        return ModbusServer.handle_pdu(self, unit, pdu)
+
+    def read_registers(self, unit, kind, address, count):
+        return self.device.read(kind, address, count)
+
+    def write_registers(self, unit, address, values):
+        self.device.write(address, values)
@@ -0,0 +1,186 @@
+"""
+Statistics of the Modbus requests made by a device.
+
+RequestStats records the time taken by each request, whether it failed, and the number of bytes
+it sent and received, grouped by the function and block of registers requested. Latencies are
+counted in a fixed histogram, so recording a request takes constant time and memory. A Compressor
+or Inverter created with `instrument=True` records every request it makes, and returns a summary
+from its stats() method.
+"""
+__version__ = '0.1.1'
+
+import threading
+from bisect import bisect_left
+from time import monotonic
+
+#: tuple: upper bounds in seconds of the buckets of the latency histograms
+default_buckets = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+# Sizes of Modbus TCP frames: 7 byte MBAP header, then the PDU.
+_request_size = {
+    'read_input_registers': lambda count: 12,
+    'read_holding_registers': lambda count: 12,
+    'write_register': lambda count: 12,
+    'write_registers': lambda count: 13 + 2 * count,
+}
+
+_response_size = {
+    'read_input_registers': lambda count: 9 + 2 * count,
+    'read_holding_registers': lambda count: 9 + 2 * count,
+    'write_register': lambda count: 12,
+    'write_registers': lambda count: 12,
+}
+
+
+class _Entry(object):
+    """Statistics of the requests for one block of registers."""
+    __slots__ = ('requests', 'errors', 'bytes_sent', 'bytes_received', 'total', 'max', 'histogram')
+
+    def __init__(self, n_buckets):
+        self.requests = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (n_buckets + 1)
+
+
+class RequestStats(object):
+    """Latency histograms and counters of Modbus requests, for each function and block of registers."""
+    def __init__(self, registers=None, buckets=default_buckets):
+        """Create empty statistics.
+
+        Args:
+            registers (RegisterMap): the registers of the device, used to name the registers requested.
+            buckets (tuple): upper bounds in seconds of the buckets of the latency histograms, in increasing order.
+        """
+        self.registers = registers
+        self.buckets = tuple(buckets)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def record(self, method, address, count, elapsed, ok):
+        """Record one request.
+
+        Args:
+            method (str): name of the client method, e.g. 'read_input_registers'.
+            address (int): address of the first register.
+            count (int): number of registers.
+            elapsed (float): time taken in seconds.
+            ok (bool): whether the request succeeded.
+        """
+        with self._lock:
+            key = (method, address, count)
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(len(self.buckets))
+            entry.requests += 1
+            entry.bytes_sent += _request_size[method](count)
+            if ok:
+                entry.bytes_received += _response_size[method](count)
+            else:
+                entry.errors += 1
+            entry.total += elapsed
+            if elapsed > entry.max:
+                entry.max = elapsed
+            entry.histogram[bisect_left(self.buckets, elapsed)] += 1
+
+    def reset(self):
+        """Discard all of the statistics."""
+        with self._lock:
+            self._entries = {}
+
+    def _names(self, method, address, count):
+        """Return the names of the registers in a block."""
+        if self.registers is None:
+            return ()
+        kind = 'input' if method == 'read_input_registers' else 'holding'
+        return tuple(r.name for r in self.registers.select(kind=kind)
+                     if r.address < address + count and r.end > address)
+
+    def _quantile(self, entry, q):
+        """Return the upper bound of the histogram bucket containing a quantile of the latencies."""
+        target = q * entry.requests
+        n = 0
+        for bound, count in zip(self.buckets, entry.histogram):
+            n += count
+            if n >= target:
+                return min(bound, entry.max)
+        return entry.max
+
+    def summary(self):
+        """Return the statistics of each function and block of registers.
+
+        Returns:
+            list: dicts with the 'method', 'address', 'count' and 'registers' names of the block, and
+            the number of 'requests' and 'errors', 'bytes_sent' and 'bytes_received', and the 'mean',
+            'p50', 'p95' and 'max' latency in seconds. Quantiles are the upper bound of their
+            histogram bucket. The counts in each bucket are under 'histogram'."""
+        with self._lock:
+            items = sorted(self._entries.items())
+            rows = []
+            for (method, address, count), entry in items:
+                rows.append({
+                    'method': method, 'address': address, 'count': count,
+                    'registers': self._names(method, address, count),
+                    'requests': entry.requests, 'errors': entry.errors,
+                    'bytes_sent': entry.bytes_sent, 'bytes_received': entry.bytes_received,
+                    'mean': entry.total / entry.requests, 'p50': self._quantile(entry, 0.5),
+                    'p95': self._quantile(entry, 0.95), 'max': entry.max,
+                    'histogram': list(zip(self.buckets + (float('inf'),), entry.histogram)),
+                })
+            return rows
+
+
+def timed_request(stats, client, method, address, width, *args, **kwargs):
+    """Make a request with a Modbus client, recording it in `stats` if it is not None.
+
+    Each call is recorded as one request, so a ManagedClient should be called with resend=False,
+    leaving any retries to the caller, for every frame sent to be counted.
+
+    Args:
+        stats (RequestStats): the statistics to record the request in, or None.
+        client: the Modbus client.
+        method (str): name of the client method.
+        address (int): address of the first register, also passed to the method.
+        width (int): number of registers.
+        args: further positional arguments of the method.
+        kwargs: keyword arguments of the method.
+
+    Returns:
+        the response from the client."""
+    func = getattr(client, method)
+    if stats is None:
+        return func(address, *args, **kwargs)
+    start = monotonic()
+    try:
+        r = func(address, *args, **kwargs)
+    except Exception:
+        stats.record(method, address, width, monotonic() - start, False)
+        raise
+    stats.record(method, address, width, monotonic() - start, not r.isError())
+    return r
+
+
+def format_stats(stats):
+    """Format the statistics returned by the stats() method of a Compressor or Inverter as a table.
+
+    Args:
+        stats (dict): the statistics.
+
+    Returns:
+        str: the table."""
+    lines = ["{:<24} {:>6} {:>4} {:>8} {:>6} {:>9} {:>9} {:>9} {:>9} {:>9}  {}".format(
+        "Method", "Addr", "Regs", "Requests", "Errors", "Bytes", "Mean ms", "p50 ms", "p95 ms", "Max ms", "Registers")]
+    for row in stats['requests']:
+        lines.append("{:<24} {:>6} {:>4} {:>8} {:>6} {:>9} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f}  {}".format(
+            row['method'], row['address'], row['count'], row['requests'], row['errors'],
+            row['bytes_sent'] + row['bytes_received'], 1000 * row['mean'], 1000 * row['p50'],
+            1000 * row['p95'], 1000 * row['max'], ", ".join(row['registers'])))
+    retry = stats['retry']
+    lines.append("")
+    lines.append("Retries: {retries}  Failed calls: {failures}  Rejected calls: {rejected}  "
+                 "Breaker trips: {trips}  Breaker: {state}".format(**retry))
+    lines.append("Reconnects: {}".format(stats['reconnects']))
+    return "\n".join(lines)
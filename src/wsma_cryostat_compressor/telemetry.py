@@ -0,0 +1,267 @@
+"""
+Compact binary log of device readings.
+
+A TelemetryRecorder appends readings to a file of fixed width binary records, each holding the
+Unix time of the reading as a double followed by one value per field. The header of the file
+names the fields, so a log is self-describing. Records are buffered and written in chunks.
+
+A TelemetryLog reads a log back through a memory map. Because every record has the same size,
+the n-th record is found directly, and a time range is found by bisecting the timestamps, without
+parsing the rest of the file. With NumPy installed, as_numpy() maps the records into a structured
+array without copying them::
+
+    with TelemetryRecorder('compressor.log', Compressor._monitor_names) as recorder:
+        recorder.write_stream(comp.stream(interval=1.0, fields=recorder.fields))
+
+    log = TelemetryLog('compressor.log')
+    data = log.as_numpy(start=t0, end=t0 + 86400)
+"""
+__version__ = '0.1.1'
+
+import mmap
+import os
+import struct
+
+#: bytes: identifies a telemetry log file
+_magic = b'WSMALOG1'
+
+# magic, header size, number of fields, value type
+_header = struct.Struct('<8sII1s3x')
+
+#: int: default number of records buffered before they are written to the file
+default_chunk_size = 256
+
+#: dict: NumPy dtype of the values stored with each struct format
+_numpy_types = {'f': '<f4', 'd': '<f8'}
+
+
+def _record_struct(n, value_type):
+    return struct.Struct('<d{}{}'.format(n, value_type))
+
+
+class TelemetryRecorder(object):
+    """Writer of readings to a telemetry log file.
+
+    The compressor's registers hold 16 bit integers or 32 bit floats, so by default values are
+    stored as 32 bit floats without loss.
+    """
+    def __init__(self, path, fields, chunk_size=default_chunk_size, value_type='f'):
+        """Open a log for appending, creating it if it does not exist.
+
+        Args:
+            path (str): path of the log file.
+            fields (iterable): names of the fields in each reading.
+            chunk_size (int): number of records buffered before they are written to the file.
+            value_type (str): struct format of the values, 'f' for 32 bit or 'd' for 64 bit floats.
+
+        Raises:
+            ValueError: if the file exists and records different fields or value type.
+        """
+        if value_type not in _numpy_types:
+            raise ValueError("Unsupported value type {!r}".format(value_type))
+
+        #: tuple: names of the fields in each reading
+        self.fields = tuple(fields)
+
+        self.path = path
+        self.chunk_size = chunk_size
+        self.value_type = value_type
+        self._record = _record_struct(len(self.fields), value_type)
+        self._buffer = bytearray()
+        self._pending = 0
+
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            names = "\n".join(self.fields).encode('utf-8')
+            header_size = (_header.size + len(names) + 7) // 8 * 8
+            header = _header.pack(_magic, header_size, len(self.fields), value_type.encode('ascii')) + names
+            self._file.write(header.ljust(header_size, b'\0'))
+            self._file.flush()
+        else:
+            with TelemetryLog(path) as log:
+                if log.fields != self.fields or log.value_type != value_type:
+                    self._file.close()
+                    raise ValueError("{} records different fields".format(path))
+                size = log.header_size + len(log) * self._record.size
+            # Drop a partial record left by an interrupted write.
+            if self._file.tell() != size:
+                self._file.truncate(size)
+
+    def append(self, t, values):
+        """Add a reading.
+
+        Args:
+            t (float): Unix time of the reading.
+            values (sequence): the value of each field, in the order of self.fields.
+        """
+        self._buffer += self._record.pack(t, *values)
+        self._pending += 1
+        if self._pending >= self.chunk_size:
+            self.flush()
+
+    def write_stream(self, records):
+        """Add readings from an iterable of dicts, such as Compressor.stream().
+
+        Args:
+            records (iterable): dicts with the time of the reading under 'time' and a value for each field.
+        """
+        for record in records:
+            self.append(record['time'], [record[f] for f in self.fields])
+
+    def flush(self):
+        """Write the buffered records to the file."""
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._file.flush()
+            self._buffer = bytearray()
+            self._pending = 0
+
+    def close(self):
+        """Write the buffered records and close the file."""
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class TelemetryLog(object):
+    """Memory mapped reader of a telemetry log file.
+
+    The log is mapped when it is opened. Records appended later are seen after reopen().
+    """
+    def __init__(self, path):
+        """Open a log.
+
+        Args:
+            path (str): path of the log file.
+
+        Raises:
+            ValueError: if the file is not a telemetry log.
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, header_size, n, value_type = _header.unpack(f.read(_header.size))
+            if magic != _magic:
+                raise ValueError("{} is not a telemetry log".format(path))
+            names = f.read(header_size - _header.size).rstrip(b'\0').decode('utf-8')
+
+        #: tuple: names of the fields in each reading
+        self.fields = tuple(names.split("\n")) if n else ()
+
+        #: int: size of the header in bytes
+        self.header_size = header_size
+
+        self.value_type = value_type.decode('ascii')
+        self._record = _record_struct(n, self.value_type)
+        self._mmap = None
+        self._len = 0
+        self.reopen()
+
+    def reopen(self):
+        """Map the file again, to see records appended since it was opened."""
+        self.close()
+        size = os.path.getsize(self.path)
+        self._len = (size - self.header_size) // self._record.size
+        if self._len > 0:
+            with open(self.path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), self.header_size + self._len * self._record.size,
+                                       access=mmap.ACCESS_READ)
+
+    def close(self):
+        """Unmap the file. Arrays returned by as_numpy() keep the map open until they are deleted."""
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+            self._mmap = None
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _time(self, i):
+        return struct.unpack_from('<d', self._mmap, self.header_size + i * self._record.size)[0]
+
+    def find(self, t):
+        """Return the index of the first record made at or after a time.
+
+        Records are assumed to be in time order.
+
+        Args:
+            t (float): Unix time.
+
+        Returns:
+            int: the index, or len(self) if all records were made before `t`."""
+        lo, hi = 0, self._len
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._time(mid) < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _range(self, start, end):
+        """Return the indices of the first record and after the last record in a time range."""
+        first = 0 if start is None else self.find(start)
+        last = self._len if end is None else self.find(end)
+        return first, max(first, last)
+
+    def records(self, start=None, end=None):
+        """Iterate over the records in a time range.
+
+        Args:
+            start (float): Unix time of the earliest record, or None to start at the first record.
+            end (float): Unix time after the latest record, or None to end at the last record.
+
+        Yields:
+            tuple: the time of the reading followed by the value of each field."""
+        first, last = self._range(start, end)
+        size = self._record.size
+        offset = self.header_size + first * size
+        for _ in range(last - first):
+            yield self._record.unpack_from(self._mmap, offset)
+            offset += size
+
+    def read(self, start=None, end=None):
+        """Read the records in a time range as dicts.
+
+        Args:
+            start (float): Unix time of the earliest record, or None to start at the first record.
+            end (float): Unix time after the latest record, or None to end at the last record.
+
+        Returns:
+            list: dicts with the time of the reading under 'time' and the value of each field."""
+        keys = ('time',) + self.fields
+        return [dict(zip(keys, record)) for record in self.records(start, end)]
+
+    def as_numpy(self, start=None, end=None):
+        """Map the records in a time range into a NumPy structured array. Requires NumPy.
+
+        Args:
+            start (float): Unix time of the earliest record, or None to start at the first record.
+            end (float): Unix time after the latest record, or None to end at the last record.
+
+        Returns:
+            numpy.ndarray: read only structured array with a 'time' field and one field per recorded field."""
+        import numpy as np
+
+        value_type = _numpy_types[self.value_type]
+        dtype = np.dtype([('time', '<f8')] + [(f, value_type) for f in self.fields])
+        first, last = self._range(start, end)
+        if last == first:
+            return np.empty(0, dtype=dtype)
+        return np.frombuffer(self._mmap, dtype=dtype, count=last - first,
+                             offset=self.header_size + first * dtype.itemsize)
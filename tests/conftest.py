@@ -0,0 +1,15 @@
+import pytest
+
+
+def pytest_addoption(parser):
+    parser.addoption("--run-benchmarks", action="store_true",
+                     help="Run the benchmarks in test_benchmarks.py, which are skipped by default")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-benchmarks"):
+        return
+    skip = pytest.mark.skip(reason="benchmarks only run with --run-benchmarks")
+    for item in items:
+        if 'benchmark' in getattr(item, 'fixturenames', ()):
+            item.add_marker(skip)
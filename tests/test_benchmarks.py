@@ -0,0 +1,107 @@
+"""
+Benchmarks of polling latency and throughput, run against the local Modbus simulator.
+
+Requires pytest-benchmark. The benchmarks are skipped by a plain pytest run. Run them with::
+
+    pytest tests/test_benchmarks.py --run-benchmarks --benchmark-autosave
+
+and compare runs with ``--benchmark-compare`` to catch regressions.
+"""
+import struct
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+import wsma_cryostat_compressor  # noqa: E402
+from wsma_cryostat_compressor.fleet import CompressorFleet  # noqa: E402
+from wsma_cryostat_compressor.inverter import Inverter  # noqa: E402
+from wsma_cryostat_compressor.simulator import ModbusSimulator, SimulatedCompressor, SimulatedInverter  # noqa: E402
+
+#: float: simulated network latency per request in seconds
+latency = 0.001
+
+
+@pytest.fixture(scope='module')
+def compressor_sim():
+    with ModbusSimulator(SimulatedCompressor(), latency=latency) as sim:
+        yield sim
+
+
+@pytest.fixture(scope='module')
+def inverter_sim():
+    with ModbusSimulator(SimulatedInverter(), latency=latency) as sim:
+        yield sim
+
+
+@pytest.fixture(scope='module')
+def compressor(compressor_sim):
+    return wsma_cryostat_compressor.Compressor(ip_address=compressor_sim.host, port=compressor_sim.port)
+
+
+@pytest.mark.benchmark(group='compressor')
+def test_compressor_update(benchmark, compressor):
+    compressor.batch_update = True
+    benchmark(compressor.update)
+
+
+@pytest.mark.benchmark(group='compressor')
+def test_compressor_update_unbatched(benchmark, compressor):
+    compressor.batch_update = False
+    try:
+        benchmark(compressor.update)
+    finally:
+        compressor.batch_update = True
+
+
+@pytest.mark.benchmark(group='compressor')
+def test_compressor_read_subset(benchmark, compressor):
+    benchmark(compressor.read, ['helium_temp', 'high_pressure', 'state_code'])
+
+
+@pytest.mark.benchmark(group='compressor')
+def test_compressor_construction(benchmark, compressor_sim):
+    benchmark(wsma_cryostat_compressor.Compressor, ip_address=compressor_sim.host, port=compressor_sim.port)
+
+
+@pytest.mark.benchmark(group='inverter')
+def test_inverter_update(benchmark, inverter_sim):
+    inv = Inverter(address=inverter_sim.host, port=inverter_sim.port)
+    benchmark(inv.update)
+
+
+@pytest.mark.benchmark(group='decoding')
+def test_decode_float32(benchmark):
+    hi, lo = struct.unpack('>HH', struct.pack('>f', 68.1))
+    benchmark(wsma_cryostat_compressor._float32_decoder.decode, [lo, hi])
+
+
+@pytest.mark.benchmark(group='decoding')
+def test_decode_update_block(benchmark):
+    names = wsma_cryostat_compressor.Compressor._monitor_names
+    decoder = wsma_cryostat_compressor.compressor_registers.decoder(names)
+    registers = SimulatedCompressor().read('input', decoder.start, decoder.count)
+    benchmark(decoder.decode, registers)
+
+
+@pytest.mark.benchmark(group='decoding')
+def test_error_code_to_string_uncached(benchmark):
+    benchmark(wsma_cryostat_compressor._error_code_to_string.__wrapped__, -(2 ** 31 - 1))
+
+
+@pytest.mark.benchmark(group='decoding')
+def test_error_code_to_string_cached(benchmark):
+    benchmark(wsma_cryostat_compressor._error_code_to_string, -(2 ** 31 - 1))
+
+
+@pytest.mark.benchmark(group='fleet')
+def test_fleet_poll(benchmark):
+    sims = [ModbusSimulator(SimulatedCompressor(), latency=latency).start() for _ in range(16)]
+    try:
+        with CompressorFleet([(s.host, s.port) for s in sims]) as fleet:
+            fleet.poll()
+            rows = benchmark(fleet.poll)
+        assert all(r['ok'] for r in rows)
+    finally:
+        for s in sims:
+            s.stop()
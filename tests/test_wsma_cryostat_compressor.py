@@ -1,6 +1,639 @@
+import struct
 
+import wsma_cryostat_compressor
 from wsma_cryostat_compressor.cli import main
 
 
+def _float_registers(value):
+    """Encode a float as the two registers used by the compressor (big endian bytes, little endian words)."""
+    hi, lo = struct.unpack('>HH', struct.pack('>f', value))
+    return [lo, hi]
+
+
+class FakeResponse(object):
+    def __init__(self, registers):
+        self.registers = registers
+
+    def isError(self):
+        return False
+
+
+class FakeCompressorClient(object):
+    """Stand-in for ModbusTcpClient serving a fixed compressor input register map."""
+    def __init__(self, *args, **kwargs):
+        self.requests = 0
+        self.input_registers = {1: 3, 2: 1, 29: 0, 30: 1, 31: 1234, 32: 0x0508}
+        floats = {3: 0.0, 5: -3.0, 7: 20.5, 9: 30.25, 11: 40.0, 13: 50.0, 15: 100.0, 17: 101.0,
+                  19: 300.0, 21: 301.0, 23: 200.0, 25: 12.0, 27: 1000.5, 33: 1.25}
+        for addr, value in floats.items():
+            lo, hi = _float_registers(value)
+            self.input_registers[addr] = lo
+            self.input_registers[addr + 1] = hi
+
+    def read_input_registers(self, address, count=1, **kwargs):
+        self.requests += 1
+        return FakeResponse([self.input_registers.get(a, 0) for a in range(address, address + count)])
+
+    def connect(self):
+        return True
+
+    def close(self):
+        pass
+
+
+def _fake_compressor(monkeypatch, **kwargs):
+    monkeypatch.setattr(wsma_cryostat_compressor, 'ModbusTcpClient', FakeCompressorClient)
+    return wsma_cryostat_compressor.Compressor(ip_address='127.0.0.1', **kwargs)
+
+
 def test_main():
     main([])
+
+
+def test_batch_update_matches_individual_reads(monkeypatch):
+    comp = _fake_compressor(monkeypatch)
+    comp._client.client.requests = 0
+    comp.update()
+    assert comp._client.client.requests == 1
+    batched = comp.status
+
+    comp.batch_update = False
+    comp.update()
+    assert comp._client.client.requests == 16
+    assert comp.status == batched
+    assert comp.helium_temp == 50.0
+    assert comp.hours == 1000.5
+    assert comp.errors == 'Coolant In Low, Coolant In High'
+
+
+def test_block_decoder_matches_payload_decoder():
+    from pymodbus.constants import Endian
+    from pymodbus.payload import BinaryPayloadDecoder
+    from wsma_cryostat_compressor.decoder import BlockDecoder
+
+    registers = _float_registers(-12.5) + [7] + _float_registers(3.0e5) + [0xFFFE]
+    decoder = BlockDecoder([('a', 10, 'float32'), ('c', 13, 'float32'), ('d', 15, 'int16')], start=10)
+    a, c, d = decoder.decode(registers)
+
+    payload = BinaryPayloadDecoder.fromRegisters(registers[3:5], byteorder=Endian.Big, wordorder=Endian.Little)
+    assert a == -12.5
+    assert c == payload.decode_32bit_float()
+    assert d == -2
+    assert decoder.decode_dict(registers)['c'] == 3.0e5
+
+
+def test_register_map_accessors(monkeypatch):
+    from wsma_cryostat_compressor.registers import compressor_registers
+
+    comp = _fake_compressor(monkeypatch)
+    assert compressor_registers.span(comp._monitor_names) == (1, 28)
+    assert comp.get_coolant_out() == 30.25
+    assert comp.get_enabled() == 1
+    assert comp.low_pressure_average == 101.0
+    assert compressor_registers['oil_temp'].unit_for(comp) == 'C'
+    assert wsma_cryostat_compressor.Compressor.hours.__doc__ == "float: Hours of operation"
+
+
+def test_read_plans_fewest_requests(monkeypatch):
+    from wsma_cryostat_compressor.planner import plan_reads
+    from wsma_cryostat_compressor.registers import compressor_registers
+
+    comp = _fake_compressor(monkeypatch)
+    comp._client.client.requests = 0
+    values = comp.read(['helium_temp', 'high_pressure', 'state_code'])
+    assert values == {'state_code': 3, 'helium_temp': 50.0, 'high_pressure': 300.0}
+    assert comp._client.client.requests == 2
+
+    values = comp.read(['helium_temp', 'high_pressure', 'state_code', 'model'], max_gap=30)
+    assert values['model'] == 'CPA28H4'
+    assert comp._client.client.requests == 3
+
+    spans = plan_reads(compressor_registers.select(kind='input'), max_count=10, max_gap=0)
+    assert [(s.start, s.count) for s in spans] == [(1, 10), (11, 10), (21, 10), (31, 4)]
+
+
+def test_async_compressor(monkeypatch):
+    import asyncio
+    from wsma_cryostat_compressor.aio import AsyncCompressor
+
+    monkeypatch.setattr(wsma_cryostat_compressor, 'ModbusTcpClient', FakeCompressorClient)
+
+    async def poll():
+        devices = [AsyncCompressor('10.0.0.{}'.format(i)) for i in range(4)]
+        await asyncio.gather(*(d.connect() for d in devices))
+        await asyncio.gather(*(d.update() for d in devices))
+        return devices
+
+    devices = asyncio.run(poll())
+    assert [d.helium_temp for d in devices] == [50.0] * 4
+    assert devices[2].ip_address == '10.0.0.2'
+
+
+def test_fleet_poll_isolates_dead_panels(monkeypatch):
+    import time
+    from wsma_cryostat_compressor.fleet import CompressorFleet, format_table
+
+    class DeadPanelClient(FakeCompressorClient):
+        def read_input_registers(self, address, count=1, **kwargs):
+            if self.host == '10.0.0.9':
+                raise RuntimeError("Could not read registers")
+            if self.host == '10.0.0.2':
+                time.sleep(0.05)
+            return super(DeadPanelClient, self).read_input_registers(address, count=count)
+
+        def __init__(self, host, **kwargs):
+            super(DeadPanelClient, self).__init__()
+            self.host = host
+
+    monkeypatch.setattr(wsma_cryostat_compressor, 'ModbusTcpClient', DeadPanelClient)
+    with CompressorFleet(['10.0.0.1', '10.0.0.9', '10.0.0.2'], fields=['state_code', 'helium_temp']) as fleet:
+        rows = fleet.poll()
+        fast = fleet.compressors[('10.0.0.1', wsma_cryostat_compressor.default_port)]
+        assert fast._client.client.requests == len(fast._registers.plan(fleet.fields, max_gap=fast.read_gap))
+    assert [r['ok'] for r in rows] == [True, False, True]
+    assert rows[2]['helium_temp'] == 50.0
+    assert rows[0]['elapsed'] < 0.05 <= rows[2]['elapsed']
+    assert 'Could not read' in rows[1]['error']
+    assert format_table(rows).splitlines()[0].split() == ['address', 'error', 'state_code', 'helium_temp']
+
+
+def test_managed_client_reconnects():
+    from pymodbus.exceptions import ConnectionException
+    from wsma_cryostat_compressor.connection import ManagedClient
+
+    class DroppingClient(FakeCompressorClient):
+        def __init__(self):
+            super(DroppingClient, self).__init__()
+            self.connected = False
+            self.connects = 0
+            self.fail_next = False
+
+        def connect(self):
+            self.connects += 1
+            self.connected = True
+            return True
+
+        def close(self):
+            self.connected = False
+
+        def read_input_registers(self, address, count=1, **kwargs):
+            if self.fail_next:
+                self.fail_next = False
+                raise ConnectionException("Connection unexpectedly closed")
+            return super(DroppingClient, self).read_input_registers(address, count=count)
+
+    raw = DroppingClient()
+    client = ManagedClient(raw, backoff=0.0)
+    assert client.read_input_registers(1).registers == [3]
+    raw.fail_next = True
+    assert client.read_input_registers(2).registers == [1]
+    assert client.reconnects == 1
+
+
+def test_stream_fixed_cadence(monkeypatch):
+    from wsma_cryostat_compressor import _next_deadline
+
+    comp = _fake_compressor(monkeypatch)
+    records = list(comp.stream(interval=0.01, fields=['state_code', 'oil_temp'], count=3))
+    assert [sorted(r) for r in records] == [['oil_temp', 'state_code', 'time']] * 3
+    assert records[2]['time'] - records[0]['time'] >= 0.015
+    assert _next_deadline(10.0, 1.0, 10.5) == 11.0
+    assert _next_deadline(10.0, 1.0, 13.2) == 14.0
+    assert _next_deadline(10.0, 0.0, 13.2) == 13.2
+    assert len(list(comp.stream(interval=0, count=3))) == 3
+
+
+def test_history_ring_buffer(monkeypatch):
+    from wsma_cryostat_compressor.history import History
+
+    history = History(('a', 'b'), 4)
+    for i in range(6):
+        history.append(100.0 + i, (i, 2.0 * i))
+    assert len(history) == 4
+    assert list(history.column('a')) == [2, 3, 4, 5]
+    assert list(history.times(window=1.5)) == [104.0, 105.0]
+    assert history.statistics('b')['mean'] == 7.0
+    assert history.trend('b') == 2.0
+    assert history.latest() == {'time': 105.0, 'a': 5.0, 'b': 10.0}
+
+    comp = _fake_compressor(monkeypatch, history=10)
+    comp.update()
+    assert len(comp.history) == 2
+    assert list(comp.history.column('helium_temp')) == [50.0, 50.0]
+
+
+def test_error_flags(monkeypatch):
+    from wsma_cryostat_compressor import CompressorFlag, _error_code_to_string
+
+    comp = _fake_compressor(monkeypatch)
+    assert comp.error_flags == (CompressorFlag.COOLANT_IN_LOW, CompressorFlag.COOLANT_IN_HIGH)
+    assert comp.warning_flags == ()
+    assert comp.warnings == 'None'
+    assert _error_code_to_string(-(2 ** 30 + 2 ** 19)) == 'Inverter Comm Loss, Motor Stall'
+    assert _error_code_to_string(float('-inf')) == _error_code_to_string(float('nan')) == 'None'
+
+
+def test_simulator_round_trip():
+    import pytest
+    from wsma_cryostat_compressor.inverter import Inverter
+    from wsma_cryostat_compressor.simulator import (ModbusSimulator, SimulatedCompressor,
+                                                    SimulatedInverter)
+
+    with ModbusSimulator(SimulatedCompressor(transition_time=0.05)) as sim:
+        comp = wsma_cryostat_compressor.Compressor(ip_address=sim.host, port=sim.port)
+        assert comp.model == 'CPA28H4'
+        assert abs(comp.helium_temp - 68.1) < 1e-4
+        comp._enable_delay = 0.1
+        assert comp.off() in (5, 0)
+        assert comp._wait_for_states((0,), timeout=1.0)
+        future = comp.on(wait=False)
+        assert future.result(timeout=1) in (2, 3)
+        sim.error_rate = 1.0
+        with pytest.raises(RuntimeError):
+            comp.update()
+
+    with ModbusSimulator(SimulatedInverter()) as sim:
+        inv = Inverter(address=sim.host, port=sim.port)
+        inv._set_delay = 0.0
+        assert inv.set_frequency(55.0) == 55.0
+        assert abs(inv.voltage - 201.0) < 1e-9
+
+
+def test_main_simulated(capsys):
+    main(['-a', '0.0.0.0'])
+    assert 'Operating State : Running' in capsys.readouterr().out
+
+
+def test_lazy_construction_and_identity_cache(monkeypatch, tmp_path):
+    from wsma_cryostat_compressor.cache import IdentityCache
+
+    cache = IdentityCache(str(tmp_path / 'identity.json'))
+    comp = _fake_compressor(monkeypatch, lazy=True, identity_cache=cache)
+    assert comp._client.client.requests == 0
+    assert comp.helium_temp == 50.0
+    assert comp._client.client.requests == 1
+    assert comp.model == 'CPA28H4'
+    assert comp._client.client.requests == 2
+
+    comp = _fake_compressor(monkeypatch, identity_cache=cache)
+    assert comp._client.client.requests == 1
+    assert (comp.serial, comp.software_rev, comp.temp_unit) == (1234, '1.250', 'C')
+
+
+def test_max_age_read_through(monkeypatch):
+    import time
+
+    comp = _fake_compressor(monkeypatch, max_age=0.05)
+    requests = comp._client.client.requests
+    assert comp.helium_temp == 50.0
+    assert comp.state == 'Running'
+    assert comp._client.client.requests == requests
+    time.sleep(0.06)
+    assert comp.age('helium_temp') > 0.05
+    assert comp.helium_temp == 50.0
+    assert comp.errors == 'Coolant In Low, Coolant In High'
+    assert comp._client.client.requests == requests + 1
+    assert comp.age('state_code') < 0.05
+
+
+def test_shared_memory_snapshot(monkeypatch):
+    import os
+    from wsma_cryostat_compressor.shm import SnapshotDaemon, SnapshotReader
+
+    comp = _fake_compressor(monkeypatch)
+    name = 'wsma_test_{}'.format(os.getpid())
+    daemon = SnapshotDaemon(comp, name, interval=0.01, fields=('state_code', 'helium_temp', 'hours'))
+    try:
+        with SnapshotReader(name) as reader:
+            assert reader.fields == ('state_code', 'helium_temp', 'hours')
+            assert reader.read() is None
+            daemon.poll()
+            snapshot = reader.read()
+            assert snapshot['sequence'] == 1
+            assert (snapshot['state_code'], snapshot['helium_temp'], snapshot['hours']) == (3, 50.0, 1000.5)
+    finally:
+        daemon.stop()
+
+
+def test_caching_proxy():
+    import threading
+    from wsma_cryostat_compressor.inverter import Inverter
+    from wsma_cryostat_compressor.proxy import ModbusProxy
+    from wsma_cryostat_compressor.registers import inverter_registers
+    from wsma_cryostat_compressor.simulator import (ModbusSimulator, SimulatedCompressor,
+                                                    SimulatedInverter)
+
+    with ModbusSimulator(SimulatedCompressor(transition_time=0.05), latency=0.01) as sim:
+        with ModbusProxy(sim.host, sim.port, max_age=10.0) as proxy:
+            comps = [wsma_cryostat_compressor.Compressor(ip_address=proxy.host, port=proxy.port) for _ in range(4)]
+            requests = sim.requests
+            threads = [threading.Thread(target=c.update) for c in comps for _ in range(5)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            assert sim.requests == requests
+            assert comps[0].model == 'CPA28H4'
+
+            comps[0]._enable_delay = 0.1
+            assert comps[0].off() in (5, 0)
+            assert comps[1].read(['state_code'])['state_code'] in (5, 0)
+
+    with ModbusSimulator(SimulatedInverter()) as sim:
+        with ModbusProxy(sim.host, sim.port, registers=inverter_registers) as proxy:
+            inv = Inverter(address=proxy.host, port=proxy.port)
+            inv._set_delay = 0.0
+            assert inv.set_frequency(55.0) == 55.0
+
+        with ModbusProxy(sim.host, sim.port, registers=inverter_registers, max_age=10.0) as proxy:
+            inv = Inverter(address=proxy.host, port=proxy.port)
+            upstream = proxy.upstream_requests
+            for _ in range(5):
+                inv.update()
+            assert proxy.upstream_requests == upstream
+            assert proxy.hits >= 5
+
+
+def test_telemetry_log(tmp_path):
+    from wsma_cryostat_compressor.telemetry import TelemetryLog, TelemetryRecorder
+
+    path = str(tmp_path / 'compressor.log')
+    with TelemetryRecorder(path, ('state_code', 'helium_temp'), chunk_size=4) as recorder:
+        for i in range(10):
+            recorder.append(1000.0 + i, (3, 60.5 + i))
+    with open(path, 'ab') as f:
+        f.write(b'\0' * 5)
+    with TelemetryRecorder(path, ('state_code', 'helium_temp')) as recorder:
+        recorder.write_stream([{'time': 1010.0, 'state_code': 0, 'helium_temp': 20.25}])
+
+    with TelemetryLog(path) as log:
+        assert log.fields == ('state_code', 'helium_temp')
+        assert len(log) == 11
+        assert log.find(1004.5) == 5
+        assert log.read(1004.5, 1007.0) == [{'time': 1005.0, 'state_code': 3.0, 'helium_temp': 65.5},
+                                            {'time': 1006.0, 'state_code': 3.0, 'helium_temp': 66.5}]
+        assert list(log.records(start=1010.0)) == [(1010.0, 0.0, 20.25)]
+
+
+def test_columnar_export_batches():
+    from wsma_cryostat_compressor.export import ColumnarWriter, column_types
+
+    assert column_types(('state_code', 'error_code', 'helium_temp', 'other')) == ['uint16', 'int32', 'float32', 'float64']
+
+    class ListWriter(ColumnarWriter):
+        def __init__(self, *args, **kwargs):
+            super(ListWriter, self).__init__(*args, **kwargs)
+            self.batches = []
+
+        def _write_batch(self, times, columns):
+            self.batches.append((times.tolist(), [c.typecode for c in columns], [c.tolist() for c in columns]))
+
+    with ListWriter('unused', ('state_code', 'error_code', 'helium_temp'), row_group_size=2) as writer:
+        writer.write_stream({'time': float(i), 'state_code': 3, 'error_code': -3.0, 'helium_temp': 50.5} for i in range(3))
+    assert writer.rows == 3
+    assert [b[0] for b in writer.batches] == [[0.0, 1.0], [2.0]]
+    assert writer.batches[1][1:] == (['H', 'i', 'f'], [[3], [3], [50.5]])
+
+
+def _columnar_readings():
+    codes = [-1.0, -2.0, -4.0, -(2.0 ** 30 + 2 ** 19), float('nan')]
+    return [{'time': 1000.0 + i, 'state_code': 3, 'error_code': code, 'helium_temp': 50.5 + i}
+            for i, code in enumerate(codes)]
+
+
+def test_parquet_export(tmp_path):
+    import pytest
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+    from wsma_cryostat_compressor.export import ParquetWriter, open_writer
+
+    path = str(tmp_path / 'compressor.parquet')
+    with open_writer(path, ('state_code', 'error_code', 'helium_temp'), row_group_size=2) as writer:
+        assert isinstance(writer, ParquetWriter)
+        writer.write_stream(_columnar_readings())
+    assert writer.rows == 5
+
+    f = pq.ParquetFile(path)
+    assert f.metadata.num_row_groups == 3
+    table = f.read()
+    assert table.schema.types == [pa.float64(), pa.uint16(), pa.int32(), pa.float32()]
+    assert table.column('time').to_pylist() == [1000.0, 1001.0, 1002.0, 1003.0, 1004.0]
+    assert table.column('state_code').to_pylist() == [3] * 5
+    assert table.column('error_code').to_pylist() == [1, 2, 4, 2 ** 30 + 2 ** 19, 0]
+    assert table.column('helium_temp').to_pylist() == [50.5, 51.5, 52.5, 53.5, 54.5]
+
+
+def test_hdf5_export(tmp_path):
+    import pytest
+    h5py = pytest.importorskip('h5py')
+    from wsma_cryostat_compressor.export import export_log
+    from wsma_cryostat_compressor.telemetry import TelemetryLog, TelemetryRecorder
+
+    fields = ('state_code', 'error_code', 'helium_temp')
+    log_path = str(tmp_path / 'compressor.log')
+    with TelemetryRecorder(log_path, fields) as recorder:
+        recorder.write_stream(_columnar_readings())
+    path = str(tmp_path / 'compressor.h5')
+    with TelemetryLog(log_path) as log:
+        assert export_log(log, path, row_group_size=2) == 5
+
+    with h5py.File(path, 'r') as f:
+        assert [f[name].dtype.name for name in ('time',) + fields] == ['float64', 'uint16', 'int32', 'float32']
+        assert f['error_code'].chunks == (2,)
+        assert f['time'][:].tolist() == [1000.0, 1001.0, 1002.0, 1003.0, 1004.0]
+        assert f['state_code'][:].tolist() == [3] * 5
+        assert f['error_code'][:].tolist() == [1, 2, 4, 2 ** 30 + 2 ** 19, 0]
+        assert f['helium_temp'][:].tolist() == [50.5, 51.5, 52.5, 53.5, 54.5]
+
+
+def test_poll_scheduler(monkeypatch):
+    import time
+    from wsma_cryostat_compressor.scheduler import PollScheduler
+
+    comp = _fake_compressor(monkeypatch)
+    scheduler = PollScheduler(comp, fields=('high_pressure', 'helium_temp', 'hours'),
+                              state_intervals={3: 0.02}, field_factors={'hours': 100.0})
+    first = scheduler.poll()
+    assert set(first) == {'time', 'state_code', 'high_pressure', 'helium_temp', 'hours'}
+    assert scheduler.poll() is None
+    assert scheduler.interval('hours') == 2.0
+    time.sleep(0.025)
+    requests = comp._client.client.requests
+    second = scheduler.poll()
+    assert set(second) == {'time', 'state_code', 'high_pressure', 'helium_temp'}
+    assert comp._client.client.requests == requests + 2
+    assert scheduler.requests == 4
+    assert len(list(scheduler.stream(count=2))) == 2
+
+
+def test_inverter_batched_update():
+    import pytest
+    from wsma_cryostat_compressor.inverter import Inverter
+    from wsma_cryostat_compressor.simulator import ModbusSimulator, SimulatedInverter
+
+    with ModbusSimulator(SimulatedInverter(frequency=5525, power=45)) as sim:
+        inv = Inverter(address=sim.host, port=sim.port)
+        requests = sim.requests
+        inv.update()
+        assert sim.requests == requests + 1
+        assert (inv.frequency, inv.power) == (55.25, 4.5)
+        inv.read_gap = 0
+        assert inv.read(['current', 'voltage']) == {'current': 9.5, 'voltage': 201.0}
+        assert sim.requests == requests + 3
+
+        sim.error_rate = 1.0
+        with pytest.raises(RuntimeError):
+            inv.update()
+        with pytest.raises(RuntimeError):
+            inv.get_frequency()
+
+
+def test_retry_policy_and_circuit_breaker(monkeypatch):
+    import pytest
+    from pymodbus.exceptions import ModbusIOException
+    from wsma_cryostat_compressor.retry import CircuitOpenError, RetryPolicy, OPEN, CLOSED
+
+    failures = [2]
+
+    def flaky():
+        if failures[0]:
+            failures[0] -= 1
+            raise ModbusIOException("no response")
+        return 42
+
+    policy = RetryPolicy(attempts=3, backoff=0.001, failure_threshold=2, reset_timeout=0.05, seed=1)
+    assert policy.call(flaky) == 42
+    assert policy.counters()['retries'] == 2
+
+    def dead():
+        raise ModbusIOException("no response")
+
+    for _ in range(2):
+        with pytest.raises(ModbusIOException):
+            policy.call(dead, deadline=0.0)
+    assert policy.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        policy.call(flaky)
+    assert policy.rejected == 1
+
+    import time
+    time.sleep(0.06)
+    assert policy.call(flaky) == 42
+    assert policy.state == CLOSED
+
+    comp = _fake_compressor(monkeypatch)
+    responses = [ModbusIOException("no response")] * 2
+    read = comp._client.client.read_input_registers
+    monkeypatch.setattr(comp._client.client, 'read_input_registers',
+                        lambda *args, **kwargs: responses.pop() if responses else read(*args, **kwargs))
+    assert comp._read_float32(13) == 50.0
+    assert comp.retry.retries == 2
+
+
+def test_retry_deadline_bounds_call():
+    import time
+    import pytest
+    from wsma_cryostat_compressor.retry import RetryPolicy
+    from wsma_cryostat_compressor.simulator import ModbusSimulator, SimulatedCompressor
+
+    with ModbusSimulator(SimulatedCompressor()) as sim:
+        comp = wsma_cryostat_compressor.Compressor(ip_address=sim.host, port=sim.port,
+                                                   retry=RetryPolicy(backoff=0.01, deadline=0.5))
+        sim.timeout_rate = 1.0
+        requests = sim.requests
+        start = time.monotonic()
+        with pytest.raises(RuntimeError):
+            comp.get_helium_temp()
+        assert time.monotonic() - start < 0.8
+        assert comp.retry.retries == sim.requests - requests - 1
+
+
+def test_metrics_exporter(monkeypatch):
+    from urllib.request import urlopen
+    from wsma_cryostat_compressor.inverter import Inverter
+    from wsma_cryostat_compressor.metrics import MetricsExporter
+    from wsma_cryostat_compressor.simulator import ModbusSimulator, SimulatedInverter
+
+    comp = _fake_compressor(monkeypatch)
+    with ModbusSimulator(SimulatedInverter()) as sim:
+        inv = Inverter(address=sim.host, port=sim.port)
+        with MetricsExporter({'p1': comp, 'p1-inverter': inv}, interval=60.0) as exporter:
+            requests = comp._client.client.requests
+            url = 'http://{}:{}/metrics'.format(exporter.host, exporter.port)
+            body = urlopen(url).read().decode('utf-8')
+            assert urlopen(url).read().decode('utf-8') == body
+            assert comp._client.client.requests == requests
+
+    lines = body.splitlines()
+    assert 'cryomech_up{device="p1"} 1.0' in lines
+    assert 'cryomech_compressor_helium_temp{device="p1"} 50.0' in lines
+    assert 'cryomech_compressor_error{device="p1",flag="COOLANT_IN_LOW"} 1.0' in lines
+    assert 'cryomech_compressor_warning{device="p1",flag="COOLANT_IN_LOW"} 0.0' in lines
+    assert 'cryomech_inverter_frequency{device="p1-inverter"} 60.0' in lines
+    assert '# TYPE cryomech_compressor_state_code gauge' in lines
+
+
+def test_request_stats(monkeypatch, capsys):
+    comp = _fake_compressor(monkeypatch, instrument=True)
+    comp.update()
+    stats = comp.stats()
+    block = [row for row in stats['requests'] if row['registers'][:1] == ('state_code',)][0]
+    assert block['requests'] == 2
+    assert block['errors'] == 0
+    assert block['bytes_sent'] == 24
+    assert block['bytes_received'] == 2 * (9 + 2 * block['count'])
+    assert block['p50'] <= block['max']
+    assert stats['retry']['retries'] == 0
+    assert _fake_compressor(monkeypatch).stats()['requests'] == []
+
+    calls = stats['retry']['calls']
+    comp.get_pressure_scale()
+    comp.get_temperature_scale()
+    comp.get_serial()
+    comp.get_model()
+    stats = comp.stats()
+    assert stats['retry']['calls'] == calls + 4
+    read = set(name for row in stats['requests'] if row['count'] == 1 for name in row['registers'])
+    assert {'pressure_scale', 'temperature_scale', 'serial', 'model'} <= read
+
+    # The first attempt times out, and the retry made by the policy is counted as a second request.
+    from pymodbus.exceptions import ModbusIOException
+    comp.request_stats.reset()
+    responses = [ModbusIOException("no response")]
+    read_raw = comp._client.client.read_input_registers
+    monkeypatch.setattr(comp._client.client, 'read_input_registers',
+                        lambda *args, **kwargs: responses.pop() if responses else read_raw(*args, **kwargs))
+    assert comp._read_float32(13) == 50.0
+    row, = comp.stats()['requests']
+    assert (row['requests'], row['errors']) == (2, 1)
+
+    main(['-a', '0.0.0.0', '--stats'])
+    assert 'read_input_registers' in capsys.readouterr().out
+
+
+def test_main_watch_and_stream_formats(capsys):
+    import json
+    import pytest
+    from wsma_cryostat_compressor.cli import _redraw
+
+    assert _redraw(['a', 'b', 'c'], ['a', 'x', 'c']) == '\x1b[2A\r\x1b[2Kx\x1b[2B\r'
+    assert _redraw(['a', 'b'], ['a', 'b']) == ''
+
+    main(['-a', '0.0.0.0', '-f', 'json', '-w', '0.01', '-n', '2', '--fields', 'state_code,helium_temp'])
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[0])['helium_temp'] == 68.1
+
+    main(['-a', '0.0.0.0', '-f', 'csv', '--fields', 'state_code,hours'])
+    assert capsys.readouterr().out.splitlines()[0] == 'time,state_code,hours'
+
+    main(['-a', '0.0.0.0', '-w', '0.01', '-n', '2'])
+    assert capsys.readouterr().out.count('Operating State') == 1
+
+    with pytest.raises(SystemExit):
+        main(['-a', '0.0.0.0', '-w', '0', '-n', '3', '-f', 'json'])
+    assert 'must be greater than 0' in capsys.readouterr().err
+
+    with pytest.raises(SystemExit):
+        main(['-a', '0.0.0.0', '-f', 'json', '--fields', 'state,helium_temp'])
+    assert 'valid fields are: state_code' in capsys.readouterr().err